@@ -1,7 +1,15 @@
 # store/admin.py - Update to handle None values safely
 
-from django.contrib import admin
-from .models import Category, Product, Cart, CartItem, Order, OrderItem
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.urls import reverse
+from . import catalog, exports
+from .pricing import from_paise
+from .models import ArchivedOrder, ArchivedOrderItem, Category, Product, Promotion, Cart, CartItem, Order, OrderItem, Task, UnmatchedPayment
+from django.utils import timezone
 from django.utils.html import format_html
 
 @admin.register(Category)
@@ -10,13 +18,28 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name']
 
+class ProductActionForm(ActionForm):
+    value = forms.DecimalField(
+        required=False,
+        max_digits=10,
+        decimal_places=2,
+        help_text='Percent, rupees or units, for the actions that need one',
+    )
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'price', 'stock', 'available', 'created']
+    list_display = ['name', 'price', 'stock', 'stock_reserved', 'views', 'available', 'created']
     list_filter = ['available', 'created', 'category']
     list_editable = ['price', 'stock', 'available']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
+    readonly_fields = ['stock_reserved', 'views']
+    # Each runs as one UPDATE over the whole selection (see store.catalog)
+    action_form = ProductActionForm
+    actions = [
+        'change_price_percent', 'change_price_amount', 'start_sale', 'end_sale',
+        'make_available', 'make_unavailable', 'adjust_stock', 'set_stock', 'mark_sold_out',
+    ]
     
     fieldsets = (
         ('Basic Information', {
@@ -26,11 +49,94 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('price', 'old_price')
         }),
         ('Inventory', {
-            'fields': ('stock', 'available')
+            'fields': ('stock', 'stock_reserved', 'available')
         }),
         ('Sizes Available', {
             'fields': ('size_s', 'size_m', 'size_l', 'size_xl', 'size_xxl')
         }),
+        ('Popularity', {
+            'fields': ('views',)
+        }),
+    )
+    
+    def action_value(self, request):
+        try:
+            value = ProductActionForm.base_fields['value'].clean(request.POST.get('value'))
+        except forms.ValidationError:
+            value = None
+        if value is None:
+            self.message_user(request, 'Enter a number in the value box for this action.', messages.ERROR)
+        return value
+    
+    def run_bulk(self, request, operation, queryset, *args):
+        updated = operation(queryset, *args)
+        self.message_user(request, f'{updated} products updated.')
+    
+    def change_price_percent(self, request, queryset):
+        value = self.action_value(request)
+        if value is not None:
+            self.run_bulk(request, catalog.change_price_percent, queryset, value)
+    change_price_percent.short_description = 'Change price by value %% (negative to lower)'
+    
+    def change_price_amount(self, request, queryset):
+        value = self.action_value(request)
+        if value is not None:
+            self.run_bulk(request, catalog.change_price_amount, queryset, value)
+    change_price_amount.short_description = 'Change price by value ₹ (negative to lower)'
+    
+    def start_sale(self, request, queryset):
+        value = self.action_value(request)
+        if value is not None:
+            if not 0 < value < 100:
+                self.message_user(request, 'A sale needs a discount between 0 and 100%.', messages.ERROR)
+                return
+            self.run_bulk(request, catalog.start_sale, queryset, value)
+    start_sale.short_description = 'Start sale: value %% off, keeping old price'
+    
+    def end_sale(self, request, queryset):
+        self.run_bulk(request, catalog.end_sale, queryset)
+    end_sale.short_description = 'End sale: restore old price'
+    
+    def make_available(self, request, queryset):
+        self.run_bulk(request, catalog.set_available, queryset, True)
+    make_available.short_description = 'Mark selected products available'
+    
+    def make_unavailable(self, request, queryset):
+        self.run_bulk(request, catalog.set_available, queryset, False)
+    make_unavailable.short_description = 'Mark selected products unavailable'
+    
+    def adjust_stock(self, request, queryset):
+        value = self.action_value(request)
+        if value is not None:
+            self.run_bulk(request, catalog.adjust_stock, queryset, int(value))
+    adjust_stock.short_description = 'Add value units to stock (negative to remove)'
+    
+    def set_stock(self, request, queryset):
+        value = self.action_value(request)
+        if value is not None:
+            self.run_bulk(request, catalog.set_stock, queryset, max(int(value), 0))
+    set_stock.short_description = 'Set stock to value units'
+    
+    def mark_sold_out(self, request, queryset):
+        self.run_bulk(request, catalog.set_stock, queryset, 0)
+    mark_sold_out.short_description = 'Mark selected products sold out'
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'kind', 'code', 'category', 'active', 'starts_at', 'ends_at']
+    list_filter = ['kind', 'active', 'category']
+    search_fields = ['name', 'code']
+    
+    fieldsets = (
+        ('Rule', {
+            'fields': ('name', 'kind', 'code', 'category', 'active')
+        }),
+        ('Discount', {
+            'fields': ('percent_off', 'amount_off_paise', 'buy_quantity', 'get_quantity', 'min_subtotal_paise')
+        }),
+        ('Schedule', {
+            'fields': ('starts_at', 'ends_at')
+        }),
     )
 
 class CartItemInline(admin.TabularInline):
@@ -38,6 +144,9 @@ class CartItemInline(admin.TabularInline):
     extra = 0
     readonly_fields = ['product', 'quantity', 'size', 'display_cost']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+    
     def display_cost(self, obj):
         try:
             cost = obj.get_cost()
@@ -55,6 +164,10 @@ class CartAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'session_key']
     inlines = [CartItemInline]
     
+    def get_queryset(self, request):
+        # The item count and total columns read every cart's items and products
+        return super().get_queryset(request).prefetch_related('items__product')
+    
     def display_total_price(self, obj):
         try:
             total = obj.get_total_price()
@@ -70,6 +183,9 @@ class OrderItemInline(admin.TabularInline):
     extra = 0
     readonly_fields = ['product', 'price', 'quantity', 'size', 'display_cost']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+    
     def display_cost(self, obj):
         try:
             cost = obj.get_cost()
@@ -86,7 +202,8 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['paid', 'created']
     search_fields = ['first_name', 'last_name', 'email', 'payment_id']
     inlines = [OrderItemInline]
-    readonly_fields = ['payment_id', 'razorpay_order_id', 'payment_signature', 'created', 'display_total_amount']
+    readonly_fields = ['payment_id', 'razorpay_order_id', 'payment_signature', 'created', 'discount_amount', 'shipping_amount', 'display_total_amount']
+    actions = ['export_csv', 'export_jsonl']
     
     fieldsets = (
         ('Customer Information', {
@@ -96,7 +213,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('address', 'city', 'postal_code')
         }),
         ('Order Information', {
-            'fields': ('display_total_amount', 'paid', 'created')
+            'fields': ('discount_amount', 'shipping_amount', 'display_total_amount', 'paid', 'created')
         }),
         ('Payment Information', {
             'fields': ('payment_id', 'razorpay_order_id', 'payment_signature'),
@@ -119,6 +236,67 @@ class OrderAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).prefetch_related('items')
+    
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        # Links to orders that have since been archived still work
+        if (
+            self.model is Order
+            and not Order.objects.filter(pk=object_id).exists()
+            and ArchivedOrder.objects.filter(pk=object_id).exists()
+        ):
+            return redirect('admin:store_archivedorder_change', object_id)
+        return super().change_view(request, object_id, form_url, extra_context)
+    
+    def export_response(self, queryset, format):
+        # Streamed chunk by chunk, so large selections neither fill memory nor time out
+        response = StreamingHttpResponse(exports.stream(queryset, format), content_type=exports.FORMATS[format])
+        response['Content-Disposition'] = f'attachment; filename="orders-{timezone.now():%Y%m%d-%H%M}.{format}"'
+        return response
+    
+    def export_csv(self, request, queryset):
+        return self.export_response(queryset, 'csv')
+    export_csv.short_description = 'Export selected orders as CSV'
+    
+    def export_jsonl(self, request, queryset):
+        return self.export_response(queryset, 'jsonl')
+    export_jsonl.short_description = 'Export selected orders as JSON lines'
+
+class ArchivedOrderItemInline(OrderItemInline):
+    model = ArchivedOrderItem
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(OrderAdmin):
+    """Read-only view of orders moved out by `python manage.py archive_orders`"""
+    inlines = [ArchivedOrderItemInline]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(UnmatchedPayment)
+class UnmatchedPaymentAdmin(admin.ModelAdmin):
+    """Payments flagged by `python manage.py reconcile_payments`"""
+    list_display = ['payment_id', 'razorpay_order_id', 'display_amount', 'email', 'reason', 'order_link', 'resolved', 'created']
+    list_filter = ['reason', 'resolved']
+    list_editable = ['resolved']
+    search_fields = ['payment_id', 'razorpay_order_id', 'email']
+    readonly_fields = ['payment_id', 'razorpay_order_id', 'order_link', 'amount_paise', 'email', 'reason', 'created']
+    
+    def display_amount(self, obj):
+        return f'₹{from_paise(obj.amount_paise)}'
+    display_amount.short_description = 'Amount'
+    
+    def order_link(self, obj):
+        # By id, as the order may have been archived since
+        if obj.order_id is None:
+            return '-'
+        return format_html('<a href="{}">#{}</a>', reverse('admin:store_order_change', args=[obj.order_id]), obj.order_id)
+    order_link.short_description = 'Order'
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -143,4 +321,16 @@ class OrderItemAdmin(admin.ModelAdmin):
             return '₹0'
         except (TypeError, AttributeError):
             return '₹0'
-    display_cost.short_description = 'Total'
\ No newline at end of file
+    display_cost.short_description = 'Total'
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'run_at', 'updated']
+    list_filter = ['status', 'name']
+    readonly_fields = ['attempts', 'locked_until', 'last_error', 'created', 'updated']
+    actions = ['retry_tasks']
+    
+    def retry_tasks(self, request, queryset):
+        updated = queryset.exclude(status=Task.RUNNING).update(status=Task.PENDING, run_at=timezone.now())
+        self.message_user(request, f'{updated} tasks queued to run again.')
+    retry_tasks.short_description = 'Run selected tasks again'
@@ -0,0 +1,85 @@
+# store/archive.py
+"""
+Hot/cold storage for orders.
+
+Paid orders older than ORDER_ARCHIVE_AFTER_DAYS are moved, with their
+items, into ArchivedOrder and ArchivedOrderItem, keeping their ids. Each
+batch is copied with INSERT ... SELECT and deleted in one transaction, so
+an order is always in exactly one of the two tables. Order and OrderItem
+then only hold recent and unpaid orders, and the indexes, admin
+changelists and sorts over them stay small.
+
+Pages that look orders up by id or list a customer's orders read the hot
+table first and fall through to the archive (get_order, customer_orders).
+"""
+from datetime import timedelta
+from heapq import merge
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+def table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def columns(model):
+    return ', '.join(connection.ops.quote_name(field.column) for field in model._meta.concrete_fields)
+
+
+def archive_orders(before=None, batch_size=500):
+    """Move paid orders created before `before` to the archive, returning how many moved"""
+    before = before or timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Order.objects.filter(paid=True, created__lt=before)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return moved
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(f'''
+                    INSERT INTO {table(ArchivedOrder)} ({columns(ArchivedOrder)})
+                    SELECT {columns(ArchivedOrder)} FROM {table(Order)} WHERE id IN ({placeholders})
+                ''', ids)
+                cursor.execute(f'''
+                    INSERT INTO {table(ArchivedOrderItem)} ({columns(ArchivedOrderItem)})
+                    SELECT {columns(ArchivedOrderItem)} FROM {table(OrderItem)} WHERE order_id IN ({placeholders})
+                ''', ids)
+                cursor.execute(f'DELETE FROM {table(OrderItem)} WHERE order_id IN ({placeholders})', ids)
+                cursor.execute(f'DELETE FROM {table(Order)} WHERE id IN ({placeholders})', ids)
+        moved += len(ids)
+
+
+def get_order(**lookup):
+    """The order matching `lookup`, live or archived, with items and products loaded"""
+    for model in (Order, ArchivedOrder):
+        order = model.objects.prefetch_related('items__product').filter(**lookup).first()
+        if order is not None:
+            return order
+    raise Order.DoesNotExist
+
+
+def customer_orders(user, before=None, limit=20):
+    """
+    Up to `limit` of the user's orders, newest first, from both tables.
+    `before` is a (created, id) keyset cursor; ids are shared by both
+    tables, so the same cursor pages through them as one list.
+    """
+    pages = []
+    for model in (Order, ArchivedOrder):
+        orders = model.objects.filter(user=user).order_by('-created', '-id')
+        if before:
+            created, order_id = before
+            orders = orders.filter(Q(created__lt=created) | Q(created=created, id__lt=order_id))
+        pages.append(list(orders.prefetch_related('items__product')[:limit]))
+    newest_first = merge(*pages, key=lambda order: (order.created, order.id), reverse=True)
+    return [order for order, _ in zip(newest_first, range(limit))]
@@ -0,0 +1,253 @@
+# store/autocomplete.py
+"""
+Search-as-you-type suggestions from an in-memory prefix index.
+
+Each worker keeps the distinct words of the available products' names in
+a sorted list, with a sorted array of the ids of the products using each
+word alongside (8 bytes a posting, rather than a set entry's 30 or so).
+The words a query token can complete to are one bisect range of that
+list, and every token must start a word of a suggested product's name.
+Products are ranked by popularity (units sold, then views), and
+categories whose names match are suggested first. Nothing here queries
+the database beyond the catalog version check.
+
+Each word also keeps its LIMIT most popular products, so a one-word
+query only ranks those of the words it completes to, however many
+products use them. Queries that still look at many ids (`t`, or several
+broad words) are remembered until the index next changes, up to
+CACHE_SIZE of them, dropping the oldest first.
+
+The index is built in full once and then kept current: when the catalog
+version changes only products updated since the last refresh are
+re-read, and the index is rebuilt outright if the product count no longer
+adds up (deleted products leave no row to read) and every
+AUTOCOMPLETE_REBUILD_SECONDS, which also picks up popularity changes made
+by plain UPDATEs.
+"""
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from datetime import timedelta
+from heapq import nlargest
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import catalog
+from .models import Category, Product
+
+LIMIT = 10
+CATEGORY_LIMIT = 3
+# Remember results for queries that looked at more product ids than this
+CACHE_SCANNED = 2000
+# ...and at most this many of them per worker
+CACHE_SIZE = 1000
+# Products saved this close to a refresh are read again by the next one, in
+# case their transaction had not committed yet
+SYNC_OVERLAP = timedelta(seconds=5)
+
+PRODUCT_FIELDS = ['id', 'name', 'slug', 'category_id', 'units_sold', 'views']
+WORD = re.compile(r'\w+')
+
+
+def popularity(product):
+    """Units sold, with views breaking ties, as one int"""
+    return product['units_sold'] << 32 | min(product['views'], 0xFFFFFFFF)
+
+
+def words(text):
+    # Interned so every product naming a word shares one string
+    return tuple(map(sys.intern, WORD.findall(text.casefold())))
+
+
+class AutocompleteIndex:
+    def __init__(self, products, categories, version, synced_at):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.synced_at = synced_at  # Products updated since then are re-read on the next refresh
+        self.products = {}  # id -> (name, slug, category id, popularity, name words)
+        self.cache = {}
+        # reverse() takes tens of microseconds, so resolve the URLs once
+        self.home_url = reverse('store:home')
+        self.product_url = reverse('store:product_detail', args=[0, 'slug']).replace('/0/slug/', '/{}/{}/')
+        # Held while updating in place, so lookups never see a half-applied change
+        self.lock = threading.Lock()
+
+        postings = {}
+        for product in products:
+            for word in set(self.store(product)):
+                postings.setdefault(word, []).append(product['id'])
+        self.vocabulary = sorted(postings)  # Distinct words, sorted
+        # Sorted ids of the products using each word, and the LIMIT most popular of them
+        self.postings = [array('q', sorted(postings[word])) for word in self.vocabulary]
+        self.best = [self.most_popular(ids) for ids in self.postings]
+        self.set_categories(categories)
+
+    def popularity(self, product_id):
+        return self.products[product_id][3]
+
+    def most_popular(self, product_ids):
+        return nlargest(LIMIT, product_ids, key=self.popularity)
+
+    def store(self, product):
+        """Keep what suggestions show for a product row, returning its name's words"""
+        name_words = words(product['name'])
+        self.products[product['id']] = (
+            product['name'],
+            product['slug'],
+            product['category_id'],
+            popularity(product),
+            name_words,
+        )
+        return name_words
+
+    def add(self, product):
+        for word in set(self.store(product)):
+            position = bisect_left(self.vocabulary, word)
+            if position == len(self.vocabulary) or self.vocabulary[position] != word:
+                self.vocabulary.insert(position, word)
+                self.postings.insert(position, array('q'))
+                self.best.insert(position, [])
+            insort(self.postings[position], product['id'])
+            self.best[position] = self.most_popular(self.best[position] + [product['id']])
+
+    def remove(self, product_id):
+        entry = self.products.pop(product_id, None)
+        if entry is None:
+            return
+        for word in set(entry[4]):
+            position = bisect_left(self.vocabulary, word)
+            ids = self.postings[position]
+            del ids[bisect_left(ids, product_id)]
+            if not ids:
+                del self.vocabulary[position]
+                del self.postings[position]
+                del self.best[position]
+            elif product_id in self.best[position]:
+                self.best[position] = self.most_popular(ids)
+
+    def set_categories(self, categories):
+        """(id, name, slug) rows; weights are the units sold across each category"""
+        weights = {}
+        for _, _, category_id, weight, _ in self.products.values():
+            weights[category_id] = weights.get(category_id, 0) + (weight >> 32)
+        self.categories = sorted(
+            ((weights.get(category_id, 0), name, slug, words(name)) for category_id, name, slug in categories),
+            key=lambda category: (-category[0], category[1]),
+        )
+
+    def update(self, products, categories, version):
+        """Apply changed product rows (unavailable ones are dropped) and the current categories"""
+        with self.lock:
+            for product in products:
+                self.remove(product['id'])
+                if product['available']:
+                    self.add(product)
+            self.set_categories(categories)
+            self.version = version
+            self.cache = {}
+
+    def completions(self, prefix):
+        """The vocabulary range of words starting with prefix"""
+        start = bisect_left(self.vocabulary, prefix)
+        # Every word starting with prefix sorts before prefix + the last code point
+        end = bisect_left(self.vocabulary, prefix + '\U0010ffff', start)
+        return start, end
+
+    def suggest(self, query, limit=LIMIT):
+        """[(kind, label, url)] for the best categories and products completing query"""
+        tokens = words(query)
+        if not tokens:
+            return []
+        with self.lock:
+            key = ' '.join(tokens)
+            if key not in self.cache:
+                suggestions, scanned = self.find(tokens)
+                if scanned <= CACHE_SCANNED:
+                    return suggestions[:limit]
+                if len(self.cache) >= CACHE_SIZE:
+                    del self.cache[next(iter(self.cache))]
+                self.cache[key] = suggestions
+            return self.cache[key][:limit]
+
+    def find(self, tokens):
+        """
+        Up to LIMIT suggestions for query tokens, each of which must start a
+        word of the name, and how many product ids were looked at
+        """
+        suggestions = [
+            ('category', name, f'{self.home_url}?category={slug}')
+            for _, name, slug, name_words in self.categories
+            if all(any(word.startswith(token) for word in name_words) for token in tokens)
+        ][:CATEGORY_LIMIT]
+
+        ranges = [self.completions(token) for token in tokens]
+        if len(ranges) == 1:
+            # The most popular products completing one token are among the
+            # most popular of each word it completes to
+            candidates = [self.best[start:end] for start, end in ranges]
+        else:
+            candidates = [self.postings[start:end] for start, end in ranges]
+        scanned = sum(len(ids) for token in candidates for ids in token)
+        matching = sorted((set().union(*token) for token in candidates), key=len)
+        matching = matching[0].intersection(*matching[1:])
+
+        best = nlargest(LIMIT - len(suggestions), matching, key=self.popularity)
+        suggestions += [
+            ('product', self.products[product_id][0], self.product_url.format(product_id, self.products[product_id][1]))
+            for product_id in best
+        ]
+        return suggestions, scanned
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def category_rows():
+    return list(Category.objects.values_list('id', 'name', 'slug'))
+
+
+def build_index(version):
+    synced_at = timezone.now()
+    products = Product.objects.filter(available=True).values(*PRODUCT_FIELDS).iterator(chunk_size=2000)
+    return AutocompleteIndex(products, category_rows(), version, synced_at)
+
+
+def is_current(index, version):
+    return (
+        index is not None
+        and index.version == version
+        and time.monotonic() - index.built_at <= settings.AUTOCOMPLETE_REBUILD_SECONDS
+    )
+
+
+def refresh_index(index, version):
+    """Bring an index up to a new catalog version, returning the index to use"""
+    if index is None or time.monotonic() - index.built_at > settings.AUTOCOMPLETE_REBUILD_SECONDS:
+        return build_index(version)
+    synced_at = timezone.now()
+    changed = list(
+        Product.objects.filter(updated__gte=index.synced_at - SYNC_OVERLAP).values(*PRODUCT_FIELDS, 'available')
+    )
+    index.update(changed, category_rows(), version)
+    index.synced_at = synced_at
+    if len(index.products) != Product.objects.filter(available=True).count():
+        return build_index(version)
+    return index
+
+
+def get_index():
+    """Return the autocomplete index, updating it for a new catalog version"""
+    global _index
+    version = catalog.get_version()
+    if not is_current(_index, version):
+        with _lock:
+            # Another thread may have updated it while this one waited
+            if not is_current(_index, version):
+                _index = refresh_index(_index, version)
+    return _index
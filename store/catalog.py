@@ -0,0 +1,102 @@
+# store/catalog.py
+"""
+Catalog version and bulk catalog changes.
+
+The version is a token stored in JobCheckpoint that changes whenever a product or
+category is saved or deleted. Anything derived from the whole catalog
+(facet indexes, feeds, ...) is keyed by it, so each worker can tell with
+one indexed lookup whether what it built is still current. Code that
+changes products with queryset.update() or bulk_create() bypasses the
+signals and must call bump_version() itself.
+
+The bulk operations below change any number of products with a single
+UPDATE inside a transaction, and bump the version once.
+"""
+import uuid
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Category, JobCheckpoint, Product
+
+CHECKPOINT = 'catalog'
+
+
+def get_version():
+    return JobCheckpoint.get_position(CHECKPOINT)
+
+
+def bump_version():
+    """Mark everything derived from the catalog as stale"""
+    # A random token rather than a counter, so concurrent bumps cannot
+    # collapse into one value that a reader has already seen
+    version = uuid.uuid4().hex
+    JobCheckpoint.set_position(CHECKPOINT, version)
+    return version
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed(sender, **kwargs):
+    bump_version()
+
+
+def bulk_update(queryset, **changes):
+    """Apply `changes` to every product in `queryset` in one UPDATE"""
+    with transaction.atomic():
+        # update() skips auto_now, so set it here for feeds and sitemaps
+        updated = queryset.update(updated=timezone.now(), **changes)
+        bump_version()
+    return updated
+
+
+def money(expression):
+    """Round to paise and never below zero"""
+    field = DecimalField(max_digits=10, decimal_places=2)
+    return Greatest(Round(expression, 2, output_field=field), Value(Decimal('0.00'), output_field=field))
+
+
+def change_price_percent(queryset, percent):
+    """Raise (or with a negative percent, lower) prices by `percent`"""
+    factor = 1 + Decimal(percent) / 100
+    return bulk_update(queryset, price=money(F('price') * factor))
+
+
+def change_price_amount(queryset, amount):
+    """Add `amount` rupees to prices (negative to lower them)"""
+    return bulk_update(queryset, price=money(F('price') + Decimal(amount)))
+
+
+def start_sale(queryset, percent):
+    """Cut prices by `percent` off the pre-sale price, which is kept as old_price"""
+    factor = 1 - Decimal(percent) / 100
+    # Products already on sale keep their original old_price, and the new
+    # cut replaces the old one rather than compounding on it
+    original = Coalesce(F('old_price'), F('price'))
+    return bulk_update(queryset, old_price=original, price=money(original * factor))
+
+
+def end_sale(queryset):
+    """Put sale prices back to old_price"""
+    return bulk_update(queryset.filter(old_price__isnull=False), price=F('old_price'), old_price=None)
+
+
+def set_available(queryset, available):
+    return bulk_update(queryset, available=available)
+
+
+def adjust_stock(queryset, delta):
+    """Add `delta` units to stock, never going below the units held for pending payments"""
+    return bulk_update(queryset, stock=Greatest(F('stock') + delta, F('stock_reserved')))
+
+
+def set_stock(queryset, stock):
+    """Set stock to `stock` units, or to the units held if more are held"""
+    return bulk_update(queryset, stock=Greatest(Value(stock), F('stock_reserved')))
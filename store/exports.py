@@ -0,0 +1,151 @@
+# store/exports.py
+"""
+Order exports for fulfilment, as CSV (one row per order item) or JSONL
+(one line per order).
+
+Orders are read with .iterator() in id order, EXPORT_CHUNK_SIZE at a
+time, with their items and products prefetched per chunk, and each chunk
+is rendered and handed on before the next is read. Memory is bounded by
+the chunk size, not the size of the export, and the output can be
+streamed to a browser or written to a file as it is produced.
+
+Orders moved to ArchivedOrder (store.archive) keep their ids, so the
+command's exports read both tables and merge them in id order: a date
+range or a --resume run covers every order whichever table it is in.
+"""
+import csv
+import json
+from datetime import datetime, time
+from heapq import merge
+
+from django.utils import timezone
+
+from .feeds import Echo
+from .models import ArchivedOrder, JobCheckpoint, Order
+
+CHECKPOINT = 'order_export'
+
+EXPORT_CHUNK_SIZE = 1000
+
+CSV_COLUMNS = [
+    'order_id', 'created', 'paid', 'first_name', 'last_name', 'email',
+    'address', 'city', 'postal_code', 'payment_id', 'razorpay_order_id', 'total_amount',
+    'product_id', 'product', 'size', 'quantity', 'price',
+]
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def start_of(day):
+    """Midnight at the start of `day` in the site's time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def orders(since=None, until=None, paid=True, after_id=0):
+    """
+    Live and archived orders to export, as a list of querysets: created on
+    days [since, until), paid or not (None for both), after an id
+    """
+    querysets = []
+    for model in (Order, ArchivedOrder):
+        queryset = model.objects.filter(id__gt=after_id)
+        if since:
+            queryset = queryset.filter(created__gte=start_of(since))
+        if until:
+            queryset = queryset.filter(created__lt=start_of(until))
+        if paid is not None:
+            queryset = queryset.filter(paid=paid)
+        querysets.append(queryset)
+    return querysets
+
+
+def order_chunks(querysets, chunk_size=EXPORT_CHUNK_SIZE):
+    """Lists of up to chunk_size orders from one queryset or several, in id order, with items prefetched"""
+    if not isinstance(querysets, (list, tuple)):
+        querysets = [querysets]
+    rows = merge(
+        *[
+            queryset.order_by('id').prefetch_related('items__product').iterator(chunk_size=chunk_size)
+            for queryset in querysets
+        ],
+        key=lambda order: order.id,
+    )
+    chunk = []
+    for order in rows:
+        chunk.append(order)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def order_fields(order):
+    return {
+        'order_id': order.id,
+        'created': order.created.isoformat(),
+        'paid': order.paid,
+        'first_name': order.first_name,
+        'last_name': order.last_name,
+        'email': order.email,
+        'address': order.address,
+        'city': order.city,
+        'postal_code': order.postal_code,
+        'payment_id': order.payment_id or '',
+        'razorpay_order_id': order.razorpay_order_id or '',
+        'total_amount': str(order.total_amount),
+    }
+
+
+def item_fields(item):
+    return {
+        'product_id': item.product_id,
+        'product': item.product.name,
+        'size': item.size,
+        'quantity': item.quantity,
+        'price': str(item.price),
+    }
+
+
+def render_csv(chunk, header=False):
+    writer = csv.writer(Echo())
+    lines = [writer.writerow(CSV_COLUMNS)] if header else []
+    for order in chunk:
+        fields = order_fields(order)
+        for item in order.items.all():
+            row = {**fields, **item_fields(item)}
+            lines.append(writer.writerow([row[column] for column in CSV_COLUMNS]))
+    return ''.join(lines)
+
+
+def render_jsonl(chunk, header=False):
+    return ''.join(
+        json.dumps({
+            **order_fields(order),
+            'items': [item_fields(item) for item in order.items.all()],
+        }) + '\n'
+        for order in chunk
+    )
+
+
+def export(querysets, format='csv', header=True):
+    """Yield (last order id, text) for each chunk of a queryset, or of several merged by id"""
+    render = render_csv if format == 'csv' else render_jsonl
+    for number, chunk in enumerate(order_chunks(querysets)):
+        yield chunk[-1].id, render(chunk, header=header and number == 0)
+
+
+def stream(queryset, format='csv'):
+    """The export as text chunks, for a StreamingHttpResponse"""
+    return (text for _, text in export(queryset, format))
+
+
+def last_exported_id():
+    return int(JobCheckpoint.get_position(CHECKPOINT, '0'))
+
+
+def mark_exported(order_id):
+    JobCheckpoint.set_position(CHECKPOINT, order_id)
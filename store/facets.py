@@ -0,0 +1,194 @@
+# store/facets.py
+"""
+Faceted browsing over an in-memory index of the available products.
+
+The index is built from one query per catalog version (see
+store.catalog) and keeps, for every facet value, a bitset of the products
+that have it, as a Python int. Filtering is AND across facets and OR
+within one, and a facet value's count is the popcount of its bitset
+intersected with the other facets' filters, so neither depends on a
+GROUP BY over the catalog. The bitsets are laid out once per sort order
+with bit i being the i-th product in that order, which makes a page the
+next few set bits of the result.
+
+Stock moves without a catalog version bump (reservations and sales use
+UPDATEs), so the index is also rebuilt after FACET_REFRESH_SECONDS and
+the in-stock facet can lag by that much.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from . import catalog
+from .models import Category, Product
+from .pricing import to_paise
+
+PRODUCT_SORTS = {
+    'new': '-created',
+    'best_sellers': '-units_sold',
+    'trending': '-trending_score',
+}
+
+SIZES = [('S', 'size_s'), ('M', 'size_m'), ('L', 'size_l'), ('XL', 'size_xl'), ('XXL', 'size_xxl')]
+
+# (key, label, from paise inclusive, to paise exclusive)
+PRICE_BANDS = [
+    ('under-500', 'Under ₹500', 0, 50000),
+    ('500-1000', '₹500 – ₹1,000', 50000, 100000),
+    ('1000-1500', '₹1,000 – ₹1,500', 100000, 150000),
+    ('1500-plus', '₹1,500 and above', 150000, None),
+]
+
+IN_STOCK = 'in_stock'
+
+FACETS = [
+    ('category', 'Category'),
+    ('size', 'Size'),
+    ('price', 'Price'),
+    ('stock', 'Availability'),
+]
+
+Result = namedtuple('Result', 'product_ids total counts has_next')
+
+
+class FacetIndex:
+    def __init__(self, products, categories, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.labels = {
+            'category': dict(categories),
+            'size': {size: size for size, _ in SIZES},
+            'price': {key: label for key, label, _, _ in PRICE_BANDS},
+            'stock': {IN_STOCK: 'In stock'},
+        }
+        self.size = len(products)
+        self.all = (1 << self.size) - 1
+        values = [self.facet_values(product) for product in products]
+        # sort -> product ids in that order, and sort -> facet -> value -> bitset
+        self.ids = {}
+        self.masks = {}
+        for sort, ordering in PRODUCT_SORTS.items():
+            key = ordering.lstrip('-')
+            order = sorted(
+                range(len(products)),
+                key=lambda i: (products[i][key], products[i]['id']),
+                reverse=ordering.startswith('-'),
+            )
+            self.ids[sort] = [products[i]['id'] for i in order]
+            self.masks[sort] = self.build_masks(values[i] for i in order)
+
+    def facet_values(self, product):
+        """The (facet, value) pairs a product row belongs to"""
+        values = []
+        if product['category__slug'] in self.labels['category']:
+            values.append(('category', product['category__slug']))
+        for size, field in SIZES:
+            if product[field]:
+                values.append(('size', size))
+        paise = to_paise(product['price'])
+        for key, _, low, high in PRICE_BANDS:
+            if paise >= low and (high is None or paise < high):
+                values.append(('price', key))
+        if product['stock'] > product['stock_reserved']:
+            values.append(('stock', IN_STOCK))
+        return values
+
+    def build_masks(self, products):
+        """Bitsets for each facet value, from facet values listed in bit order"""
+        # Set bits in byte arrays and convert once: OR-ing into a growing
+        # int would copy it for every product
+        width = (self.size + 7) // 8
+        masks = {facet: {value: bytearray(width) for value in self.labels[facet]} for facet, _ in FACETS}
+        for bit, values in enumerate(products):
+            byte, flag = bit >> 3, 1 << (bit & 7)
+            for facet, value in values:
+                masks[facet][value][byte] |= flag
+        return {
+            facet: {value: int.from_bytes(bits, 'little') for value, bits in values.items()}
+            for facet, values in masks.items()
+        }
+
+    def clean(self, filters):
+        """Drop filter values the index does not know, and empty facets"""
+        return {
+            facet: {value for value in values if value in self.labels[facet]}
+            for facet, values in filters.items()
+            if facet in self.labels and any(value in self.labels[facet] for value in values)
+        }
+
+    def search(self, filters, sort='new', offset=0, limit=12):
+        """Return a page of product ids in `sort` order plus counts for every facet value"""
+        filters = self.clean(filters)
+        masks = self.masks[sort]
+        selected = {}
+        for facet, values in filters.items():
+            selected[facet] = 0
+            for value in values:
+                selected[facet] |= masks[facet][value]
+
+        matches = self.all
+        for mask in selected.values():
+            matches &= mask
+
+        counts = {}
+        for facet, _ in FACETS:
+            # A facet's own selection does not narrow its counts, so
+            # shoppers can see what picking another value would give
+            others = self.all
+            for other, mask in selected.items():
+                if other != facet:
+                    others &= mask
+            counts[facet] = {
+                value: (others & mask).bit_count()
+                for value, mask in masks[facet].items()
+            }
+
+        # Bit i is the i-th product in this sort, so read the set bits low to high
+        bits = format(matches, 'b')[::-1] if matches else ''
+        positions = []
+        position = bits.find('1')
+        while position != -1 and len(positions) <= offset + limit:
+            positions.append(position)
+            position = bits.find('1', position + 1)
+        page = positions[offset:offset + limit]
+        return Result(
+            [self.ids[sort][p] for p in page],
+            matches.bit_count(),
+            counts,
+            len(positions) > offset + limit,
+        )
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def build_index(version):
+    fields = ['id', 'category__slug', 'price', 'stock', 'stock_reserved']
+    fields += [field for _, field in SIZES]
+    fields += [ordering.lstrip('-') for ordering in PRODUCT_SORTS.values()]
+    products = list(Product.objects.filter(available=True).values(*fields))
+    categories = Category.objects.order_by('name').values_list('slug', 'name')
+    return FacetIndex(products, categories, version)
+
+
+def is_stale(index, version):
+    return (
+        index is None
+        or index.version != version
+        or time.monotonic() - index.built_at > settings.FACET_REFRESH_SECONDS
+    )
+
+
+def get_index():
+    """Return the facet index, rebuilding it for a new catalog version"""
+    global _index
+    version = catalog.get_version()
+    if is_stale(_index, version):
+        with _lock:
+            # Another thread may have rebuilt it while this one waited
+            if is_stale(_index, version):
+                _index = build_index(version)
+    return _index
@@ -0,0 +1,202 @@
+# store/feeds.py
+"""
+Product feeds (XML and CSV) and the sitemap.
+
+Every document is produced by a generator over Product.objects.iterator(),
+so memory stays flat however large the catalog is: rows are fetched from
+the database in chunks and written out in chunks. `generate_feeds` writes
+the same output gzipped into FEED_ROOT and records the catalog version it
+was built from. The views serve those files while the version still
+matches and stream a fresh copy otherwise. Stock changes do not bump the
+catalog version, so the files are also only served for
+FEED_MAX_AGE_MINUTES after they were written, which bounds how stale
+their availability can be.
+"""
+import csv
+import gzip
+import math
+import os
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import catalog
+from .models import JobCheckpoint, Product
+
+CHECKPOINT = 'feeds'
+
+SITEMAP_PAGE_SIZE = 50000  # The sitemap protocol's limit per file
+ROWS_PER_CHUNK = 500
+DB_CHUNK_SIZE = 2000
+
+CSV_COLUMNS = ['id', 'title', 'category', 'price', 'old_price', 'availability', 'sizes', 'image_link', 'link']
+
+CONTENT_TYPES = {
+    'xml': 'application/xml',
+    'csv': 'text/csv',
+}
+
+
+def absolute(path):
+    return settings.SITE_URL.rstrip('/') + path
+
+
+def products():
+    return (
+        Product.objects.filter(available=True)
+        .select_related('category')
+        .order_by('id')
+    )
+
+
+def product_rows(queryset=None):
+    """Feed fields for each available product, read in chunks"""
+    queryset = products() if queryset is None else queryset
+    for product in queryset.iterator(chunk_size=DB_CHUNK_SIZE):
+        yield {
+            'id': product.id,
+            'title': product.name,
+            'category': product.category.name,
+            'price': f'{product.price} INR',
+            'old_price': f'{product.old_price} INR' if product.old_price else '',
+            'availability': 'in stock' if product.available_stock > 0 else 'out of stock',
+            'sizes': ','.join(product.available_sizes()),
+            'image_link': absolute(product.image.url) if product.image else '',
+            'link': absolute(product.get_absolute_url()),
+        }
+
+
+def chunked(pieces):
+    """Join small strings so a streaming response sends fewer, larger writes"""
+    buffer = []
+    for piece in pieces:
+        buffer.append(piece)
+        if len(buffer) >= ROWS_PER_CHUNK:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def xml_feed():
+    """An RSS 2.0 product feed in the Google Merchant Center format"""
+    def pieces():
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n<channel>\n'
+        yield f'<title>Loom State</title>\n<link>{escape(absolute("/"))}</link>\n'
+        for row in product_rows():
+            yield '<item>'
+            yield f'<g:id>{row["id"]}</g:id>'
+            yield f'<title>{escape(row["title"])}</title>'
+            yield f'<link>{escape(row["link"])}</link>'
+            yield f'<g:product_type>{escape(row["category"])}</g:product_type>'
+            if row['old_price']:
+                # Merchant feeds list the regular price and the discounted one separately
+                yield f'<g:price>{row["old_price"]}</g:price>'
+                yield f'<g:sale_price>{row["price"]}</g:sale_price>'
+            else:
+                yield f'<g:price>{row["price"]}</g:price>'
+            yield f'<g:availability>{row["availability"]}</g:availability>'
+            yield f'<g:size>{escape(row["sizes"])}</g:size>'
+            if row['image_link']:
+                yield f'<g:image_link>{escape(row["image_link"])}</g:image_link>'
+            yield '</item>\n'
+        yield '</channel>\n</rss>\n'
+    return chunked(pieces())
+
+
+class Echo:
+    """A file-like object whose write() hands back the line csv.writer built"""
+    def write(self, value):
+        return value
+
+
+def csv_feed():
+    writer = csv.writer(Echo())
+
+    def pieces():
+        yield writer.writerow(CSV_COLUMNS)
+        for row in product_rows():
+            yield writer.writerow([row[column] for column in CSV_COLUMNS])
+    return chunked(pieces())
+
+
+def sitemap_pages():
+    return max(math.ceil(products().count() / SITEMAP_PAGE_SIZE), 1)
+
+
+def sitemap_index(pages=None):
+    pages = pages or sitemap_pages()
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for page in range(1, pages + 1):
+        url = absolute(reverse('store:sitemap_products', args=[page]))
+        yield f'<sitemap><loc>{escape(url)}</loc></sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def sitemap(page):
+    """Page `page` (from 1) of the product sitemap"""
+    start = (page - 1) * SITEMAP_PAGE_SIZE
+    queryset = products().select_related(None).only('id', 'slug', 'updated')[start:start + SITEMAP_PAGE_SIZE]
+
+    def pieces():
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        if page == 1:
+            yield f'<url><loc>{escape(absolute(reverse("store:home")))}</loc></url>\n'
+        for product in queryset.iterator(chunk_size=DB_CHUNK_SIZE):
+            url = absolute(product.get_absolute_url())
+            yield f'<url><loc>{escape(url)}</loc><lastmod>{product.updated.date().isoformat()}</lastmod></url>\n'
+        yield '</urlset>\n'
+    return chunked(pieces())
+
+
+def feed_path(name):
+    return os.path.join(settings.FEED_ROOT, f'{name}.gz')
+
+
+def write_gzip(name, chunks):
+    """Write chunks to FEED_ROOT/<name>.gz, replacing the old file only once complete"""
+    os.makedirs(settings.FEED_ROOT, exist_ok=True)
+    path = feed_path(name)
+    partial = f'{path}.partial'
+    with gzip.open(partial, 'wt', encoding='utf-8') as out:
+        for chunk in chunks:
+            out.write(chunk)
+    os.replace(partial, path)
+    return path
+
+
+def pregenerate():
+    """Write every feed and sitemap page gzipped, returning the file names"""
+    # Read before generating: a change made meanwhile leaves the files stale
+    version = catalog.get_version()
+    pages = sitemap_pages()
+    documents = [
+        ('products.xml', xml_feed()),
+        ('products.csv', csv_feed()),
+        ('sitemap.xml', sitemap_index(pages)),
+    ]
+    documents += [(f'sitemap-products-{page}.xml', sitemap(page)) for page in range(1, pages + 1)]
+    written = [os.path.basename(write_gzip(name, chunks)) for name, chunks in documents]
+    JobCheckpoint.set_position(CHECKPOINT, version)
+    return written
+
+
+def pregenerated(name):
+    """Path of the gzipped copy of `name` if it matches the current catalog and is recent"""
+    path = feed_path(name)
+    # set_position saves even when the version is unchanged, so `updated` is when the files were written
+    written = JobCheckpoint.objects.filter(name=CHECKPOINT).values_list('position', 'updated').first()
+    if written is None or not os.path.exists(path):
+        return None
+    version, written_at = written
+    if version != catalog.get_version():
+        return None
+    if timezone.now() - written_at > timedelta(minutes=settings.FEED_MAX_AGE_MINUTES):
+        return None
+    return path
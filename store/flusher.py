@@ -0,0 +1,51 @@
+# store/flusher.py
+"""
+Background threads that write out what a process has buffered in memory.
+
+Metrics and product view counts are recorded in memory and written every
+few seconds by a daemon thread, and once more at interpreter exit. A
+worker forked from a process whose thread had started (a preforking
+server with --preload) does not inherit the thread, so ensure_started()
+is called whenever a value is recorded and starts one for the new pid.
+The values such a worker inherited belong to the parent, which writes
+them itself, so on_start(forked=True) must drop them.
+"""
+import atexit
+import os
+import threading
+
+from django.conf import settings
+
+
+class Flusher:
+    def __init__(self, name, flush, interval_setting, on_start=None):
+        self.name = name
+        self.flush = flush
+        self.interval_setting = interval_setting
+        self.on_start = on_start
+        self.pid = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def ensure_started(self):
+        """Start this process's thread, unless it is already running"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            forked = self.pid is not None
+            if not forked:
+                atexit.register(self.shutdown)
+            if self.on_start:
+                self.on_start(forked)
+            self.pid = os.getpid()
+            threading.Thread(target=self.run, name=f'{self.name}-flusher', daemon=True).start()
+
+    def run(self):
+        while not self.stopped.wait(getattr(settings, self.interval_setting)):
+            self.flush()
+
+    def shutdown(self):
+        self.stopped.set()
+        self.flush()
@@ -0,0 +1,178 @@
+# store/guest_cart.py
+"""
+Carts for shoppers who are not signed in, kept in a signed cookie.
+
+Browsing and editing a guest cart writes nothing to the database and needs
+no session: the lines live in the GUEST_CART_COOKIE cookie as
+`product:size:quantity` entries joined by `|`, signed so they cannot be
+edited by hand. The header badge reads the quantities straight from the
+cookie, and showing the cart costs one query for its products.
+
+The lines only become Cart and CartItem rows when the shopper starts
+paying (save_to a session cart) or signs in (save_to their own cart).
+GuestCartMiddleware reads the cookie into request.guest_cart and writes
+it back on the response when it changed.
+"""
+from django.conf import settings
+from django.core import signing
+
+from .models import CartItem, Product
+
+SALT = 'store.guest_cart'
+SIZES = ('S', 'M', 'L', 'XL', 'XXL')
+
+
+class GuestCartFull(Exception):
+    pass
+
+
+class GuestItem:
+    """A guest cart line, with the attributes templates and pricing use from CartItem"""
+
+    def __init__(self, product, size, quantity):
+        self.product = product
+        self.product_id = product.id
+        self.size = size
+        self.quantity = quantity
+
+    @property
+    def id(self):
+        return f'{self.product_id}-{self.size}'
+
+    def get_cost(self):
+        return self.product.price * self.quantity
+
+
+def parse_item_id(item_id):
+    """(product id, size) from a GuestItem id, or None"""
+    product_id, _, size = str(item_id).partition('-')
+    if not product_id.isdigit() or size not in SIZES:
+        return None
+    return int(product_id), size
+
+
+class GuestCart:
+    def __init__(self, lines=None):
+        # {(product id, size): quantity}, in the order they were added
+        self.lines = dict(lines or {})
+        self.modified = False
+        self._items = None
+
+    @classmethod
+    def from_request(cls, request):
+        try:
+            value = request.get_signed_cookie(settings.GUEST_CART_COOKIE, salt=SALT)
+        except (KeyError, signing.BadSignature):
+            return cls()
+        return cls(cls.decode(value))
+
+    @staticmethod
+    def decode(value):
+        lines = {}
+        for entry in value.split('|')[:settings.GUEST_CART_MAX_LINES]:
+            try:
+                product_id, size, quantity = entry.split(':')
+                product_id, quantity = int(product_id), int(quantity)
+            except ValueError:
+                continue
+            if size in SIZES and quantity > 0:
+                lines[product_id, size] = quantity
+        return lines
+
+    def encode(self):
+        return '|'.join(f'{product_id}:{size}:{quantity}' for (product_id, size), quantity in self.lines.items())
+
+    def get_items(self):
+        """The lines as GuestItems with their products, in one query"""
+        if self._items is None:
+            products = Product.objects.in_bulk({product_id for product_id, _ in self.lines})
+            if len(products) < len({product_id for product_id, _ in self.lines}):
+                # Drop lines for products that have been deleted since
+                self.set_lines({line: quantity for line, quantity in self.lines.items() if line[0] in products})
+            self._items = [
+                GuestItem(products[product_id], size, quantity)
+                for (product_id, size), quantity in self.lines.items()
+            ]
+        return self._items
+
+    def get_total_items(self):
+        return sum(self.lines.values())
+
+    def get_total_price(self):
+        return sum(item.get_cost() for item in self.get_items())
+
+    def set_lines(self, lines):
+        if len(lines) > settings.GUEST_CART_MAX_LINES:
+            raise GuestCartFull(f'A cart can hold at most {settings.GUEST_CART_MAX_LINES} items')
+        self.lines = lines
+        self.modified = True
+        self._items = None
+
+    def add(self, product, size, quantity):
+        if quantity < 1:
+            raise ValueError('Quantity must be at least 1')
+        lines = dict(self.lines)
+        lines[product.id, size] = lines.get((product.id, size), 0) + quantity
+        self.set_lines(lines)
+
+    def update(self, item_id, quantity):
+        """Set a line's quantity, removing it at zero; False if the line is not in the cart"""
+        line = parse_item_id(item_id)
+        if line not in self.lines:
+            return False
+        lines = dict(self.lines)
+        if quantity > 0:
+            lines[line] = quantity
+        else:
+            del lines[line]
+        self.set_lines(lines)
+        return True
+
+    def clear(self):
+        if self.lines:
+            self.set_lines({})
+
+    def save_to(self, cart):
+        """Add these lines to a Cart row, merging with lines it already has"""
+        if not self.lines:
+            return
+        existing = {(item.product_id, item.size): item for item in cart.items.all()}
+        to_update, to_create = [], []
+        for line in self.get_items():
+            item = existing.get((line.product_id, line.size))
+            if item:
+                item.quantity += line.quantity
+                to_update.append(item)
+            else:
+                to_create.append(CartItem(cart=cart, product=line.product, size=line.size, quantity=line.quantity))
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+
+    def write(self, response):
+        if not self.modified:
+            return
+        if self.lines:
+            response.set_signed_cookie(
+                settings.GUEST_CART_COOKIE,
+                self.encode(),
+                salt=SALT,
+                max_age=settings.GUEST_CART_MAX_AGE,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        else:
+            response.delete_cookie(settings.GUEST_CART_COOKIE, samesite='Lax')
+
+
+class GuestCartMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.guest_cart = GuestCart.from_request(request)
+        response = self.get_response(request)
+        request.guest_cart.write(response)
+        return response
@@ -0,0 +1,26 @@
+# store/management/commands/archive_orders.py
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.archive import archive_orders
+
+class Command(BaseCommand):
+    help = 'Move old paid orders to the archive tables (run nightly from cron)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help='Archive paid orders older than this many days'
+        )
+        parser.add_argument('--batch', type=int, default=500, help='Orders to move per transaction')
+    
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        before = timezone.now() - timedelta(days=options['days'])
+        moved = archive_orders(before, options['batch'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} orders in {elapsed:.2f}s'))
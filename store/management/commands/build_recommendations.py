@@ -0,0 +1,19 @@
+# store/management/commands/build_recommendations.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.recommendations import rebuild
+
+class Command(BaseCommand):
+    help = 'Update "frequently bought together" recommendations from new orders'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recount every order instead of only new ones')
+        parser.add_argument('--top-k', type=int, help='Recommendations to keep per product')
+    
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        updated = rebuild(full=options['full'], top_k=options['top_k'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Stored {updated} recommendations in {elapsed:.2f}s'))
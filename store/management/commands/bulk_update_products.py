@@ -0,0 +1,55 @@
+# store/management/commands/bulk_update_products.py
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import catalog
+from store.models import Product
+
+class Command(BaseCommand):
+    help = 'Reprice, put on sale, or change availability or stock for many products in one UPDATE'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--category', action='append', help='Category slug to limit to (repeatable)')
+        parser.add_argument('--ids', type=int, nargs='+', help='Product ids to limit to')
+        
+        action = parser.add_mutually_exclusive_group(required=True)
+        action.add_argument('--price-percent', type=Decimal, help='Change prices by this percent (negative to lower)')
+        action.add_argument('--price-amount', type=Decimal, help='Change prices by this many rupees')
+        action.add_argument('--sale-percent', type=Decimal, help='Start a sale: cut prices by this percent, keeping old_price')
+        action.add_argument('--end-sale', action='store_true', help='Restore prices from old_price')
+        action.add_argument('--available', action='store_true', help='Mark products available')
+        action.add_argument('--unavailable', action='store_true', help='Mark products unavailable')
+        action.add_argument('--stock-delta', type=int, help='Add this many units to stock (negative to remove)')
+        action.add_argument('--set-stock', type=int, help='Set stock to this many units')
+    
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options['category']:
+            queryset = queryset.filter(category__slug__in=options['category'])
+        if options['ids']:
+            queryset = queryset.filter(id__in=options['ids'])
+        
+        started = time.monotonic()
+        if options['price_percent'] is not None:
+            updated = catalog.change_price_percent(queryset, options['price_percent'])
+        elif options['price_amount'] is not None:
+            updated = catalog.change_price_amount(queryset, options['price_amount'])
+        elif options['sale_percent'] is not None:
+            if not 0 < options['sale_percent'] < 100:
+                raise CommandError('--sale-percent must be between 0 and 100')
+            updated = catalog.start_sale(queryset, options['sale_percent'])
+        elif options['end_sale']:
+            updated = catalog.end_sale(queryset)
+        elif options['available'] or options['unavailable']:
+            updated = catalog.set_available(queryset, options['available'])
+        elif options['stock_delta'] is not None:
+            updated = catalog.adjust_stock(queryset, options['stock_delta'])
+        else:
+            if options['set_stock'] < 0:
+                raise CommandError('--set-stock cannot be negative')
+            updated = catalog.set_stock(queryset, options['set_stock'])
+        
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} products in {elapsed:.2f}s'))
@@ -0,0 +1,299 @@
+# store/management/commands/generate_data.py
+"""
+Generate a production-sized synthetic dataset for load testing.
+
+Everything is drawn from one random.Random(seed) and every timestamp is
+an offset from --now, so the same options always produce the same data.
+Rows are written with bulk_create in batches of --batch, one transaction
+per batch. Product popularity follows a Zipf distribution (a few
+products get most orders), order volume grows towards --now, and a share
+of orders is abandoned. Open carts belong to signed-in users: guest carts
+live in a cookie (see store.guest_cart).
+
+Generated rows are recognisable (slugs start with `synthetic-`, users
+with `synthetic_`, order emails end in @example.test) and --flush
+removes them before generating again.
+"""
+import bisect
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from store import catalog
+from store.models import ArchivedOrder, Cart, CartItem, Category, Order, OrderItem, Product
+
+SLUG_PREFIX = 'synthetic-'
+USER_PREFIX = 'synthetic_'
+EMAIL_DOMAIN = 'example.test'
+IMAGE = 'products/synthetic.jpg'
+
+ADJECTIVES = ['slub', 'washed', 'heavyweight', 'organic', 'boxy', 'relaxed', 'cropped', 'vintage', 'ribbed', 'pocket']
+FABRICS = ['jersey', 'cotton', 'linen', 'pique', 'waffle', 'bamboo', 'modal', 'terry']
+STYLES = ['tee', 'crew', 'v-neck', 'henley', 'polo', 'tank', 'long sleeve', 'raglan']
+COLOURS = ['black', 'white', 'ecru', 'olive', 'navy', 'rust', 'sage', 'charcoal', 'sky', 'plum']
+FIRST_NAMES = ['Aarav', 'Diya', 'Ishaan', 'Meera', 'Kabir', 'Ananya', 'Rohan', 'Saanvi', 'Vihaan', 'Zara']
+LAST_NAMES = ['Sharma', 'Iyer', 'Khan', 'Patel', 'Reddy', 'Das', 'Mehta', 'Nair', 'Singh', 'Joshi']
+CITIES = ['Mumbai', 'Delhi', 'Bengaluru', 'Chennai', 'Kolkata', 'Pune', 'Hyderabad', 'Jaipur']
+SIZES = ['S', 'M', 'L', 'XL', 'XXL']
+SIZE_FIELDS = ['size_s', 'size_m', 'size_l', 'size_xl', 'size_xxl']
+DEFAULT_NOW = '2026-01-01T00:00:00+00:00'
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the timestamps we set on auto_now(_add) fields"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic categories, products, users, carts and orders for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--carts', type=int, default=2000, help='Open carts, at most one per user')
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--now', default=DEFAULT_NOW, help='Time the data is generated as of (ISO 8601)')
+        parser.add_argument('--years', type=float, default=3, help='How far back orders go')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Skew of product popularity (0 is uniform)')
+        parser.add_argument('--abandoned', type=float, default=0.15, help='Share of orders never paid')
+        parser.add_argument('--batch', type=int, default=5000, help='Rows per bulk_create')
+        parser.add_argument('--flush', action='store_true', help='Delete previously generated data first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch = options['batch']
+        self.now = parse_datetime(options['now'])
+        if self.now is None:
+            raise CommandError('--now must be an ISO 8601 date and time')
+        if timezone.is_naive(self.now):
+            self.now = timezone.make_aware(self.now, dt_timezone.utc)
+        started = time.monotonic()
+
+        if options['flush']:
+            self.flush()
+        elif Category.objects.filter(slug__startswith=SLUG_PREFIX).exists():
+            raise CommandError('Synthetic data already exists; pass --flush to replace it')
+
+        categories = self.create_categories(options['categories'])
+        products = self.create_products(categories, options['products'])
+        users = self.create_users(options['users'])
+        popularity = self.popularity(products, options['zipf'])
+        self.create_carts(users, popularity, options['carts'])
+        self.create_orders(users, popularity, options['orders'], options['years'], options['abandoned'])
+        self.update_units_sold()
+        # bulk_create skips the signals that normally bump it
+        catalog.bump_version()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Generated synthetic data in {elapsed:.1f}s'))
+
+    def log(self, message):
+        self.stdout.write(f'  {message}')
+
+    def flush(self):
+        querysets = [
+            Order.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}'),
+            ArchivedOrder.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}'),
+            User.objects.filter(username__startswith=USER_PREFIX),
+            Product.objects.filter(slug__startswith=SLUG_PREFIX),
+            Category.objects.filter(slug__startswith=SLUG_PREFIX),
+        ]
+        for queryset in querysets:
+            # In batches, so deleting millions of rows (and their cascades) stays in bounded memory
+            while ids := list(queryset.values_list('id', flat=True)[:self.batch]):
+                with transaction.atomic():
+                    queryset.model.objects.filter(id__in=ids).delete()
+        self.log('Removed previously generated data')
+
+    def bulk_create(self, model, rows):
+        """Insert rows in batches, returning the saved objects (with ids)"""
+        created = []
+        for batch in batched(rows, self.batch):
+            with transaction.atomic():
+                created.extend(model.objects.bulk_create(batch))
+        return created
+
+    def create_categories(self, count):
+        categories = self.bulk_create(Category, (
+            Category(
+                name=f'{self.rng.choice(COLOURS).title()} {self.rng.choice(STYLES).title()}s {n}',
+                slug=f'{SLUG_PREFIX}category-{n}',
+                description='Generated for load testing',
+            )
+            for n in range(count)
+        ))
+        self.log(f'{len(categories)} categories')
+        return categories
+
+    def create_products(self, categories, count):
+        rng = self.rng
+
+        def product(n):
+            price = Decimal(rng.choice(range(299, 2500, 50)))
+            sizes = [rng.random() < 0.8 for _ in SIZE_FIELDS]
+            if not any(sizes):
+                sizes[1] = True
+            created = self.now - timedelta(days=rng.uniform(0, 1000))
+            return Product(
+                category=rng.choice(categories),
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(FABRICS)} {rng.choice(STYLES)} in {rng.choice(COLOURS)}',
+                slug=f'{SLUG_PREFIX}product-{n}',
+                description='Generated for load testing',
+                price=price,
+                old_price=price + Decimal(rng.choice([100, 200, 300])) if rng.random() < 0.25 else None,
+                image=IMAGE,
+                stock=rng.choice([0, 5, 20, 50, 200]),
+                available=rng.random() < 0.95,
+                created=created,
+                updated=created,
+                **dict(zip(SIZE_FIELDS, sizes)),
+            )
+
+        with explicit_timestamps(Product._meta.get_field('created'), Product._meta.get_field('updated')):
+            products = self.bulk_create(Product, (product(n) for n in range(count)))
+        self.log(f'{len(products)} products')
+        return products
+
+    def create_users(self, count):
+        rng = self.rng
+        users = self.bulk_create(User, (
+            User(
+                username=f'{USER_PREFIX}{n}',
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                email=f'user{n}@{EMAIL_DOMAIN}',
+                # Hashing a real password per user would dominate the run
+                password=f'{UNUSABLE_PASSWORD_PREFIX}synthetic',
+            )
+            for n in range(count)
+        ))
+        self.log(f'{len(users)} users')
+        return users
+
+    def popularity(self, products, skew):
+        """A sampler that picks purchasable products with Zipf-distributed popularity"""
+        ranked = [p for p in products if p.available]
+        self.rng.shuffle(ranked)
+        weights = list(accumulate(1 / (rank ** skew) for rank in range(1, len(ranked) + 1)))
+        total = weights[-1]
+
+        def pick():
+            return ranked[bisect.bisect_left(weights, self.rng.random() * total)]
+        return pick
+
+    def line(self, pick):
+        product = pick()
+        size = self.rng.choice([size for size, field in zip(SIZES, SIZE_FIELDS) if getattr(product, field)])
+        quantity = self.rng.choices([1, 2, 3, 4], weights=[70, 20, 7, 3])[0]
+        return product, size, quantity
+
+    def create_carts(self, users, pick, count):
+        rng = self.rng
+        carts, lines = [], []
+        for user in rng.sample(users, min(count, len(users))):
+            updated = self.now - timedelta(hours=rng.expovariate(1 / 72))
+            carts.append(Cart(
+                user=user,
+                created_at=updated - timedelta(minutes=rng.uniform(0, 120)),
+                updated_at=updated,
+            ))
+            cart_lines = {}
+            for _ in range(rng.randint(1, 4)):
+                product, size, quantity = self.line(pick)
+                cart_lines[product, size] = quantity
+            lines.append(cart_lines)
+
+        fields = [Cart._meta.get_field('created_at'), Cart._meta.get_field('updated_at')]
+        with explicit_timestamps(*fields):
+            carts = self.bulk_create(Cart, carts)
+        items = self.bulk_create(CartItem, (
+            CartItem(cart_id=cart.id, product_id=product.id, size=size, quantity=quantity)
+            for cart, cart_lines in zip(carts, lines)
+            for (product, size), quantity in cart_lines.items()
+        ))
+        self.log(f'{len(carts)} carts with {len(items)} items')
+
+    def create_orders(self, users, pick, count, years, abandoned):
+        rng = self.rng
+        span = timedelta(days=365 * years)
+        start = self.now - span
+        fields = [Order._meta.get_field('created'), Order._meta.get_field('updated')]
+        created_orders = created_items = 0
+
+        for numbers in batched(range(count), self.batch):
+            orders, order_lines = [], []
+            for n in numbers:
+                # sqrt skews towards the present: the store grows over time
+                created = start + span * rng.random() ** 0.5
+                paid = rng.random() >= abandoned
+                user = rng.choice(users) if users and rng.random() < 0.6 else None
+                lines = [self.line(pick) for _ in range(rng.choices([1, 2, 3, 4], weights=[55, 25, 12, 8])[0])]
+                first_name = user.first_name if user else rng.choice(FIRST_NAMES)
+                last_name = user.last_name if user else rng.choice(LAST_NAMES)
+                orders.append(Order(
+                    # Ids rather than instances skip the related-object descriptors
+                    user_id=user.id if user else None,
+                    first_name=first_name,
+                    last_name=last_name,
+                    email=f'order{n}@{EMAIL_DOMAIN}',
+                    address=f'{rng.randint(1, 400)} {rng.choice(LAST_NAMES)} Road',
+                    city=rng.choice(CITIES),
+                    postal_code=str(rng.randint(110000, 859999)),
+                    created=created,
+                    updated=created,
+                    paid=paid,
+                    payment_id=f'pay_synthetic{n}' if paid else None,
+                    razorpay_order_id=f'order_synthetic{n}',
+                    total_amount=sum(product.price * quantity for product, _, quantity in lines),
+                ))
+                order_lines.append(lines)
+
+            with transaction.atomic(), explicit_timestamps(*fields):
+                orders = Order.objects.bulk_create(orders)
+                items = OrderItem.objects.bulk_create([
+                    OrderItem(order_id=order.id, product_id=product.id, price=product.price, quantity=quantity, size=size)
+                    for order, lines in zip(orders, order_lines)
+                    for product, size, quantity in lines
+                ])
+            created_orders += len(orders)
+            created_items += len(items)
+            self.log(f'{created_orders}/{count} orders, {created_items} items')
+
+    def update_units_sold(self):
+        """Set the best-seller counters from the generated paid orders in one UPDATE"""
+        sold = (
+            OrderItem.objects.filter(product=OuterRef('pk'), order__paid=True)
+            .values('product')
+            .annotate(total=Sum('quantity'))
+            .values('total')
+        )
+        Product.objects.filter(slug__startswith=SLUG_PREFIX).update(units_sold=Coalesce(Subquery(sold), 0))
@@ -0,0 +1,15 @@
+# store/management/commands/generate_feeds.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.feeds import pregenerate
+
+class Command(BaseCommand):
+    help = 'Write gzipped product feeds and sitemaps to FEED_ROOT (run after catalog changes and at least every FEED_MAX_AGE_MINUTES, e.g. hourly from cron)'
+    
+    def handle(self, *args, **kwargs):
+        started = time.monotonic()
+        written = pregenerate()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(written)} files in {elapsed:.2f}s'))
@@ -0,0 +1,49 @@
+# store/management/commands/profile_report.py
+import io
+import pstats
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from store.profiling import parse_profile_name, profile_files
+
+class Command(BaseCommand):
+    help = 'Summarise saved request profiles and list the hottest functions across them'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--url-name', action='append', help='Only include profiles of this URL name (repeatable)')
+        parser.add_argument('--top', type=int, default=25, help='Functions to list')
+        parser.add_argument(
+            '--sort', choices=['cumulative', 'tottime', 'ncalls'], default='cumulative',
+            help='Order functions by time including callees, own time, or calls'
+        )
+    
+    def handle(self, *args, **options):
+        timings = defaultdict(list)
+        paths = []
+        for path in profile_files():
+            parsed = parse_profile_name(path)
+            if parsed is None:
+                continue
+            url_name, elapsed_ms = parsed
+            if options['url_name'] and url_name not in options['url_name']:
+                continue
+            timings[url_name].append(elapsed_ms)
+            paths.append(path)
+        
+        if not paths:
+            self.stdout.write('No profiles found.')
+            return
+        
+        self.stdout.write(f'{"URL name":<30} {"requests":>8} {"mean ms":>9} {"max ms":>9}')
+        for url_name, values in sorted(timings.items(), key=lambda item: -sum(item[1])):
+            self.stdout.write(
+                f'{url_name:<30} {len(values):>8} {sum(values) / len(values):>9.1f} {max(values):>9.1f}'
+            )
+        self.stdout.write('')
+        
+        # pstats prints piecemeal, which OutputWrapper would split into lines
+        report = io.StringIO()
+        stats = pstats.Stats(*paths, stream=report)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+        self.stdout.write(report.getvalue())
@@ -0,0 +1,29 @@
+# store/management/commands/reconcile_payments.py
+from django.core.management.base import BaseCommand
+
+from store.quotes import purge_quotes
+from store.reconciliation import PAGE_SIZE, reconcile
+
+class Command(BaseCommand):
+    help = 'Check captured Razorpay payments against orders, recovering or flagging unmatched ones (run hourly from cron)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=int, help='Unix timestamp to start from instead of the last run')
+        parser.add_argument('--until', type=int, help='Unix timestamp to stop at')
+        parser.add_argument('--workers', type=int, help='Pages fetched at once (default PAYMENT_RECONCILE_WORKERS)')
+        parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    
+    def handle(self, *args, **options):
+        outcomes = reconcile(
+            since=options['since'],
+            until=options['until'],
+            workers=options['workers'],
+            page_size=options['page_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {outcomes['payments']} payments: {outcomes['matched']} matched, "
+            f"{outcomes['recovered']} recovered, {outcomes['no_items'] + outcomes['amount_mismatch']} flagged"
+        ))
+        # Quotes are only needed until their payment is reconciled
+        purged = purge_quotes()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {purged} old checkout quotes'))
@@ -0,0 +1,11 @@
+# store/management/commands/refresh_trending.py
+from django.core.management.base import BaseCommand
+
+from store.rankings import decay_trending
+
+class Command(BaseCommand):
+    help = 'Decay trending scores (run periodically, e.g. hourly from cron)'
+    
+    def handle(self, *args, **kwargs):
+        updated = decay_trending()
+        self.stdout.write(self.style.SUCCESS(f'Decayed trending scores for {updated} products'))
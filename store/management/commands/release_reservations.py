@@ -0,0 +1,11 @@
+# store/management/commands/release_reservations.py
+from django.core.management.base import BaseCommand
+
+from store.reservations import release_expired
+
+class Command(BaseCommand):
+    help = 'Return expired stock holds to stock (run every minute or so from cron)'
+    
+    def handle(self, *args, **kwargs):
+        released = release_expired()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations'))
@@ -0,0 +1,37 @@
+# store/management/commands/run_tasks.py
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.tasks import run_pending
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the due tasks once and exit')
+        parser.add_argument('--batch', type=int, default=10, help='Tasks to claim per batch')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+    
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        
+        total = 0
+        while not self.stopping:
+            close_old_connections()
+            ran = run_pending(options['batch'])
+            total += ran
+            if options['once'] and not ran:
+                break
+            if not ran:
+                time.sleep(options['sleep'])
+        
+        self.stdout.write(self.style.SUCCESS(f'Ran {total} tasks'))
+    
+    def stop(self, signum, frame):
+        # Finish the current batch, then exit
+        self.stopping = True
@@ -6,11 +6,13 @@ class Command(BaseCommand):
     help = 'Seed database with sample products'
     
     def handle(self, *args, **kwargs):
-        # Create categories
-        category = Category.objects.create(
-            name='Classic Tees',
+        # Create categories (safe to run again: existing rows are updated)
+        category, _ = Category.objects.update_or_create(
             slug='classic-tees',
-            description='Our classic collection'
+            defaults={
+                'name': 'Classic Tees',
+                'description': 'Our classic collection',
+            }
         )
         
         # Create products
@@ -31,6 +33,7 @@ class Command(BaseCommand):
         ]
         
         for product_data in products:
-            Product.objects.create(category=category, **product_data)
+            slug = product_data.pop('slug')
+            Product.objects.update_or_create(slug=slug, defaults={'category': category, **product_data})
         
         self.stdout.write(self.style.SUCCESS('Successfully seeded database'))
\ No newline at end of file
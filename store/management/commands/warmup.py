@@ -0,0 +1,27 @@
+# store/management/commands/warmup.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.warmup import STEPS, check_paths, refresh_feeds
+
+class Command(BaseCommand):
+    help = 'Load templates, URLs and catalog indexes, check deploy paths and refresh stale feeds (run on every deploy)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-feeds', action='store_true', help='Do not rewrite stale feed and sitemap files')
+        parser.add_argument('--strict', action='store_true', help='Fail if any path check fails')
+    
+    def handle(self, *args, **options):
+        steps = STEPS if options['skip_feeds'] else [*STEPS, refresh_feeds]
+        for step in steps:
+            started = time.monotonic()
+            summary = step()
+            self.stdout.write(f'{summary} in {time.monotonic() - started:.2f}s')
+        
+        problems = check_paths()
+        for problem in problems:
+            self.stdout.write(self.style.WARNING(problem))
+        if problems and options['strict']:
+            raise CommandError(f'{len(problems)} path checks failed')
+        self.stdout.write(self.style.SUCCESS('Warm-up complete'))
@@ -0,0 +1,227 @@
+# store/metrics.py
+"""
+Counters and histograms, exposed in the Prometheus text format.
+
+Recording a value only updates a dict in this process under a lock. Every
+METRICS_FLUSH_SECONDS (and at exit) a background thread writes this
+process's totals to METRICS_DIR/<pid>-<random>.json, and the metrics view
+adds up every file there plus its own live values, so each scrape sees
+the sum over all worker processes whichever worker answers it.
+
+Files from workers that have exited are kept so counters do not go
+backwards when a worker is recycled; the random part of the name stops a
+later process that is given the same pid from overwriting them. Clear
+METRICS_DIR when deploying.
+"""
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .flusher import Flusher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+registry = {}
+
+_lock = threading.Lock()
+_file_name = None  # This process's file in METRICS_DIR, named when its flusher starts
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        registry[name] = self
+
+    def key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name} takes labels {self.labels}, got {tuple(labels)}')
+        return tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        _flusher.ensure_started()
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, total, value):
+        return (total or 0) + value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        _flusher.ensure_started()
+        with _lock:
+            # [count per bucket (not cumulative)..., +Inf count, sum]
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                index = len(self.buckets)
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes, in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+
+def snapshot():
+    """This process's values as {metric name: [[label values, value], ...]}"""
+    with _lock:
+        return {
+            name: [[list(key), value if metric.kind == 'counter' else list(value)] for key, value in metric.values.items()]
+            for name, metric in registry.items()
+            if metric.values
+        }
+
+
+def own_path():
+    return _file_name and os.path.join(settings.METRICS_DIR, _file_name)
+
+
+def flush():
+    """Write this process's values where other processes can read them"""
+    data = snapshot()
+    if not data:
+        return
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = own_path()
+    partial = f'{path}.partial'
+    with open(partial, 'w') as f:
+        json.dump(data, f)
+    os.replace(partial, path)
+
+
+def collect():
+    """Values summed over every process: {metric name: {label values: value}}"""
+    snapshots = [snapshot()]
+    own = own_path()
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        if path == own:
+            continue  # The live values above are newer
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+
+    totals = defaultdict(dict)
+    for data in snapshots:
+        for name, values in data.items():
+            metric = registry.get(name)
+            if metric is None:
+                continue
+            for key, value in values:
+                key = tuple(key)
+                totals[name][key] = metric.merge(totals[name].get(key), value)
+    return totals
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def format_number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    totals = collect()
+    lines = []
+    for name, metric in sorted(registry.items()):
+        lines.append(f'# HELP {name} {metric.help}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key, value in sorted(totals.get(name, {}).items()):
+            if metric.kind == 'counter':
+                lines.append(f'{name}{format_labels(metric.labels, key)} {format_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), value[:-1]):
+                cumulative += count
+                le = format_labels(metric.labels, key, [('le', format_number(bound))])
+                lines.append(f'{name}_bucket{le} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(metric.labels, key)} {format_number(value[-1])}')
+            lines.append(f'{name}_count{format_labels(metric.labels, key)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def _flush():
+    try:
+        flush()
+    except OSError:
+        logger.exception('Could not write metrics')
+
+
+def _start(forked):
+    global _file_name
+    _file_name = f'{os.getpid()}-{uuid.uuid4().hex[:12]}.json'
+    if forked:
+        # Values recorded before the fork are the parent's, which writes
+        # them to its own file
+        with _lock:
+            for metric in registry.values():
+                metric.values.clear()
+
+
+_flusher = Flusher('metrics', _flush, 'METRICS_FLUSH_SECONDS', on_start=_start)
+
+
+# Checkout funnel
+CART_ADDS = Counter('store_cart_adds_total', 'Items added to carts', ['view'])
+CHECKOUT_STARTS = Counter('store_checkout_starts_total', 'Checkouts that reached payment order creation', ['flow'])
+ORDERS_PAID = Counter('store_orders_paid_total', 'Orders created from verified payments', ['flow'])
+
+# Razorpay
+GATEWAY_ORDERS = Counter('store_razorpay_orders_total', 'Razorpay order.create calls by outcome', ['outcome'])
+GATEWAY_LATENCY = Histogram('store_razorpay_order_create_seconds', 'Time spent in Razorpay order.create')
+SIGNATURE_FAILURES = Counter('store_payment_signature_failures_total', 'Payment callbacks whose signature did not verify')
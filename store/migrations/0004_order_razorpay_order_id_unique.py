@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:28
+
+from django.db import migrations, models
+
+
+def clear_duplicate_razorpay_order_ids(apps, schema_editor):
+    """Keep the first order per Razorpay order id so the unique index can be built"""
+    Order = apps.get_model('store', 'Order')
+    Order.objects.filter(razorpay_order_id='').update(razorpay_order_id=None)
+
+    seen = set()
+    duplicates = []
+    rows = (
+        Order.objects.exclude(razorpay_order_id=None)
+        .order_by('id')
+        .values_list('id', 'razorpay_order_id')
+    )
+    for order_id, razorpay_order_id in rows.iterator():
+        if razorpay_order_id in seen:
+            duplicates.append(order_id)
+        else:
+            seen.add(razorpay_order_id)
+    if duplicates:
+        Order.objects.filter(id__in=duplicates).update(razorpay_order_id=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_remove_order_is_guest_order_total_amount'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_razorpay_order_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='razorpay_order_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
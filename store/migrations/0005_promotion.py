@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_order_razorpay_order_id_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('kind', models.CharField(choices=[('category_percent', 'Percentage off a category'), ('buy_n_get_m', 'Buy N get M free'), ('coupon', 'Coupon code'), ('free_shipping', 'Free shipping over a threshold')], max_length=20)),
+                ('code', models.CharField(blank=True, max_length=50)),
+                ('percent_off', models.PositiveIntegerField(default=0)),
+                ('amount_off_paise', models.PositiveIntegerField(default=0)),
+                ('buy_quantity', models.PositiveIntegerField(default=0)),
+                ('get_quantity', models.PositiveIntegerField(default=0)),
+                ('min_subtotal_paise', models.PositiveIntegerField(default=0)),
+                ('active', models.BooleanField(default=True)),
+                ('starts_at', models.DateTimeField(blank=True, null=True)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='store.category')),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:33
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_units_sold(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    sold = (
+        OrderItem.objects.filter(product=models.OuterRef('pk'), order__paid=True)
+        .order_by()
+        .values('product')
+        .annotate(total=models.Sum('quantity'))
+        .values('total')
+    )
+    Product.objects.update(units_sold=Coalesce(models.Subquery(sold), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='units_sold',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-units_sold'], name='product_units_sold_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-trending_score'], name='product_trending_idx'),
+        ),
+        migrations.RunPython(backfill_units_sold, migrations.RunPython.noop),
+    ]
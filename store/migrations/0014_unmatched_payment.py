@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_cart_session_key_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnmatchedPayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.CharField(max_length=100, unique=True)),
+                ('razorpay_order_id', models.CharField(db_index=True, max_length=100)),
+                ('amount_paise', models.PositiveIntegerField()),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('reason', models.CharField(choices=[('recovered', 'Order created from held stock'), ('no_items', 'No held stock to rebuild the order from'), ('amount_mismatch', 'Order total differs from the payment')], max_length=20)),
+                ('resolved', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.order')),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
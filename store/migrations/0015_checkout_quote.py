@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0014_unmatched_payment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='unmatchedpayment',
+            name='reason',
+            field=models.CharField(choices=[('recovered', 'Order created from its checkout quote'), ('no_items', 'No checkout quote to rebuild the order from'), ('amount_mismatch', 'Order total differs from the payment')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='CheckoutQuote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('razorpay_order_id', models.CharField(max_length=100, unique=True)),
+                ('flow', models.CharField(choices=[('cart', 'Cart checkout'), ('buy_now', 'Buy now')], max_length=10)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254)),
+                ('address', models.CharField(max_length=250)),
+                ('city', models.CharField(max_length=100)),
+                ('postal_code', models.CharField(max_length=20)),
+                ('lines', models.JSONField()),
+                ('subtotal_paise', models.PositiveIntegerField()),
+                ('discount_paise', models.PositiveIntegerField()),
+                ('shipping_paise', models.PositiveIntegerField()),
+                ('total_paise', models.PositiveIntegerField()),
+                ('coupon_code', models.CharField(blank=True, max_length=50)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('cart', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.cart')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
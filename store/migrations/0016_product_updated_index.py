@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_checkout_quote'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated'], name='product_updated_idx'),
+        ),
+    ]
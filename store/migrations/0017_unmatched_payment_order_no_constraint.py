@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_product_updated_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='unmatchedpayment',
+            name='order',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.order'),
+        ),
+    ]
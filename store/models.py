@@ -1,7 +1,9 @@
 # store/models.py
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
 
 class Category(models.Model):
     name = models.CharField(max_length=200)
@@ -24,10 +26,18 @@ class Product(models.Model):
     old_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     image = models.ImageField(upload_to='products/')
     stock = models.IntegerField(default=10)
+    # Units held by open StockReservations while a payment is pending
+    stock_reserved = models.PositiveIntegerField(default=0)
     available = models.BooleanField(default=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     
+    # Popularity, maintained by store.rankings
+    units_sold = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=0)
+    # Page views, buffered in memory and flushed in batches by store.viewcounts
+    views = models.PositiveIntegerField(default=0)
+    
     # Size availability
     size_s = models.BooleanField(default=True)
     size_m = models.BooleanField(default=True)
@@ -37,6 +47,11 @@ class Product(models.Model):
     
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['-units_sold'], name='product_units_sold_idx'),
+            models.Index(fields=['-trending_score'], name='product_trending_idx'),
+            models.Index(fields=['updated'], name='product_updated_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -44,6 +59,11 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('store:product_detail', args=[self.id, self.slug])
     
+    @property
+    def available_stock(self):
+        """Units that can still be sold, not counting those held for pending payments"""
+        return self.stock - self.stock_reserved
+    
     def available_sizes(self):
         sizes = []
         if self.size_s: sizes.append('S')
@@ -53,20 +73,120 @@ class Product(models.Model):
         if self.size_xxl: sizes.append('XXL')
         return sizes
 
+class StockReservation(models.Model):
+    """Stock held for a Razorpay order until it is paid or the hold expires"""
+    HELD = 'held'
+    CONVERTED = 'converted'
+    RELEASED = 'released'
+    STATUS_CHOICES = [
+        (HELD, 'Held'),
+        (CONVERTED, 'Sold'),
+        (RELEASED, 'Released'),
+    ]
+    
+    razorpay_order_id = models.CharField(max_length=100, blank=True, db_index=True)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    size = models.CharField(max_length=3)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=HELD)
+    expires_at = models.DateTimeField()
+    created = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.product} x {self.quantity} ({self.status})'
+
+class ProductPairCount(models.Model):
+    """Number of paid orders that contained both products"""
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_product_pair'),
+        ]
+
+class ProductRecommendation(models.Model):
+    """Top products bought together with a product, rebuilt by build_recommendations"""
+    product = models.ForeignKey(Product, related_name='recommendations', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    score = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_recommendation_rank'),
+        ]
+
+class Promotion(models.Model):
+    CATEGORY_PERCENT = 'category_percent'
+    BUY_N_GET_M = 'buy_n_get_m'
+    COUPON = 'coupon'
+    FREE_SHIPPING = 'free_shipping'
+    KIND_CHOICES = [
+        (CATEGORY_PERCENT, 'Percentage off a category'),
+        (BUY_N_GET_M, 'Buy N get M free'),
+        (COUPON, 'Coupon code'),
+        (FREE_SHIPPING, 'Free shipping over a threshold'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Coupon and free shipping rules with a code only apply when it is entered
+    code = models.CharField(max_length=50, blank=True)
+    # Leave empty to apply to the whole catalog
+    category = models.ForeignKey(Category, related_name='promotions', on_delete=models.CASCADE, null=True, blank=True)
+    percent_off = models.PositiveIntegerField(default=0)
+    amount_off_paise = models.PositiveIntegerField(default=0)
+    buy_quantity = models.PositiveIntegerField(default=0)
+    get_quantity = models.PositiveIntegerField(default=0)
+    min_subtotal_paise = models.PositiveIntegerField(default=0)
+    active = models.BooleanField(default=True)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return self.name
+    
+    def clean(self):
+        if self.percent_off > 100:
+            raise ValidationError({'percent_off': 'Cannot take more than 100% off.'})
+        if self.kind == self.BUY_N_GET_M and not (self.buy_quantity and self.get_quantity):
+            raise ValidationError('Buy N get M rules need both quantities.')
+        if self.kind == self.COUPON and not self.code:
+            raise ValidationError({'code': 'Coupons need a code.'})
+        if self.code and self.kind not in (self.COUPON, self.FREE_SHIPPING):
+            raise ValidationError({'code': 'Only coupon and free shipping rules take a code.'})
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    session_key = models.CharField(max_length=40, null=True, blank=True)
+    # Guest carts are looked up by session on every page
+    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def get_items(self):
+        """The cart's items with their products, loaded once per Cart instance"""
+        # Prefetching onto the instance lets templates and the totals below
+        # share two queries instead of loading each item's product on its own
+        models.prefetch_related_objects([self], 'items__product')
+        return self.items.all()
+    
     def get_total_price(self):
-        return sum(item.get_cost() for item in self.items.all())
+        return sum(item.get_cost() for item in self.get_items())
     
     def get_total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return sum(item.quantity for item in self.get_items())
 
 
-class Order(models.Model):
+class BaseOrder(models.Model):
+    """Fields shared by live orders and archived ones"""
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -80,18 +200,33 @@ class Order(models.Model):
     
     # Payment fields
     payment_id = models.CharField(max_length=100, blank=True, null=True)
-    razorpay_order_id = models.CharField(max_length=100, blank=True, null=True)
+    razorpay_order_id = models.CharField(max_length=100, blank=True, null=True, unique=True)
     payment_signature = models.CharField(max_length=200, blank=True, null=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Promotions and coupon taken off the items' cost, and shipping added, to give total_amount
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    shipping_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
     class Meta:
-        ordering = ['-created']
+        abstract = True
     
     def __str__(self):
         return f'Order #{self.id} - {self.first_name} {self.last_name}'
     
     def get_total_cost(self):
+        """The items at their list prices, before discounts and shipping"""
         return sum(item.get_cost() for item in self.items.all())
+    
+    def get_charged_total(self):
+        """What the customer paid; buy now orders created before totals were recorded have none"""
+        return self.total_amount or self.get_total_cost()
+
+class Order(BaseOrder):
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['user', '-created'], name='order_user_created_idx'),
+        ]
 
 # store/models.py - Update the get_cost methods
 
@@ -127,4 +262,146 @@ class OrderItem(models.Model):
             return 0
     
     def __str__(self):
-        return f'{self.product.name} x {self.quantity}'
\ No newline at end of file
+        return f'{self.product.name} x {self.quantity}'
+
+
+class ArchivedOrder(BaseOrder):
+    """A paid order moved out of Order by store.archive, keeping its id"""
+    id = models.BigIntegerField(primary_key=True)
+    
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['user', '-created'], name='archived_order_user_idx'),
+        ]
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='archived_order_items', on_delete=models.CASCADE)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+    size = models.CharField(max_length=3)
+    
+    def get_cost(self):
+        return self.price * self.quantity
+    
+    def __str__(self):
+        return f'{self.product.name} x {self.quantity}'
+
+
+class CheckoutQuote(models.Model):
+    """What a shopper is paying for in a Razorpay order, saved when payment starts (see store/quotes.py)"""
+    CART = 'cart'
+    BUY_NOW = 'buy_now'
+    FLOW_CHOICES = [
+        (CART, 'Cart checkout'),
+        (BUY_NOW, 'Buy now'),
+    ]
+    
+    razorpay_order_id = models.CharField(max_length=100, unique=True)
+    flow = models.CharField(max_length=10, choices=FLOW_CHOICES)
+    user = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    cart = models.ForeignKey(Cart, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    email = models.EmailField()
+    address = models.CharField(max_length=250)
+    city = models.CharField(max_length=100)
+    postal_code = models.CharField(max_length=20)
+    # [{'product_id', 'size', 'quantity', 'unit_paise', 'discount_paise'}, ...]
+    lines = models.JSONField()
+    subtotal_paise = models.PositiveIntegerField()
+    discount_paise = models.PositiveIntegerField()
+    shipping_paise = models.PositiveIntegerField()
+    total_paise = models.PositiveIntegerField()
+    coupon_code = models.CharField(max_length=50, blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f'{self.razorpay_order_id} ({self.get_flow_display()})'
+
+
+class UnmatchedPayment(models.Model):
+    """A captured Razorpay payment that had no order, found by reconcile_payments"""
+    RECOVERED = 'recovered'
+    NO_ITEMS = 'no_items'
+    AMOUNT_MISMATCH = 'amount_mismatch'
+    REASON_CHOICES = [
+        (RECOVERED, 'Order created from its checkout quote'),
+        (NO_ITEMS, 'No checkout quote to rebuild the order from'),
+        (AMOUNT_MISMATCH, 'Order total differs from the payment'),
+    ]
+    
+    payment_id = models.CharField(max_length=100, unique=True)
+    razorpay_order_id = models.CharField(max_length=100, db_index=True)
+    # No database constraint: archive_orders moves the order to ArchivedOrder
+    # under the same id, and the order admin redirects there
+    order = models.ForeignKey(
+        Order, related_name='+', on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False
+    )
+    amount_paise = models.PositiveIntegerField()
+    email = models.EmailField(blank=True)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    resolved = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created']
+    
+    def __str__(self):
+        return f'{self.payment_id} ({self.get_reason_display()})'
+
+
+class Task(models.Model):
+    """Background job stored in the database and run by the run_tasks command"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # A running task whose lease has expired is picked up again
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.name} #{self.id} ({self.status})'
+
+
+class JobCheckpoint(models.Model):
+    """Where an incremental job (recommendations, exports, ...) left off"""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.CharField(max_length=100, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f'{self.name}: {self.position}'
+    
+    @classmethod
+    def get_position(cls, name, default=''):
+        position = cls.objects.filter(name=name).values_list('position', flat=True).first()
+        return default if position is None else position
+    
+    @classmethod
+    def set_position(cls, name, position):
+        cls.objects.update_or_create(name=name, defaults={'position': str(position)})
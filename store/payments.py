@@ -0,0 +1,74 @@
+# store/payments.py
+"""
+Razorpay access for the checkout views.
+
+The razorpay SDK pulls in requests and its HTTP stack, so it is imported
+and the client built on first use rather than when the URLconf loads.
+Workers that only serve the catalog, and management commands, never pay
+for it.
+"""
+import threading
+
+from django.conf import settings
+
+from .metrics import GATEWAY_LATENCY, GATEWAY_ORDERS, SIGNATURE_FAILURES
+
+_client = None
+_lock = threading.Lock()
+
+
+class GatewayError(Exception):
+    """Razorpay rejected a request"""
+
+
+def is_configured():
+    return bool(settings.RAZORPAY_KEY_ID and settings.RAZORPAY_KEY_SECRET)
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import razorpay
+                _client = razorpay.Client(
+                    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+                )
+    return _client
+
+
+def create_order(params):
+    """Create a Razorpay order, raising GatewayError if Razorpay rejects it"""
+    import razorpay
+    client = get_client()
+    try:
+        with GATEWAY_LATENCY.time():
+            order = client.order.create(params)
+    except razorpay.errors.BadRequestError as e:
+        GATEWAY_ORDERS.inc(outcome='rejected')
+        raise GatewayError(str(e)) from e
+    except Exception:
+        GATEWAY_ORDERS.inc(outcome='error')
+        raise
+    GATEWAY_ORDERS.inc(outcome='created')
+    return order
+
+
+def verify_signature(order_id, payment_id, signature):
+    """Check the signature Razorpay's checkout returned for a payment"""
+    import razorpay
+    try:
+        get_client().utility.verify_payment_signature({
+            'razorpay_order_id': order_id,
+            'razorpay_payment_id': payment_id,
+            'razorpay_signature': signature
+        })
+    except razorpay.errors.SignatureVerificationError:
+        SIGNATURE_FAILURES.inc()
+        return False
+    return True
+
+
+def list_payments(since, until, skip=0, count=100):
+    """One page of payments created between two unix timestamps, newest first"""
+    return get_client().payment.all({'from': since, 'to': until, 'skip': skip, 'count': count})['items']
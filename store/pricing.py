@@ -0,0 +1,229 @@
+# store/pricing.py
+"""
+Cart pricing in integer paise.
+
+Active promotions are compiled once into plain dicts and tuples and reused
+for every quote until a Promotion changes, a rule starts or ends, or
+PROMOTION_REFRESH_SECONDS pass (so other worker processes pick up admin
+edits). Pricing a cart only reads the database when rules are recompiled.
+"""
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Promotion
+
+PAISE = Decimal(100)
+
+
+def to_paise(amount):
+    """Convert a rupee amount (Decimal, int or str) to integer paise"""
+    return int((Decimal(amount) * PAISE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_paise(paise):
+    """Convert integer paise back to a two-place rupee Decimal"""
+    return (Decimal(paise) / PAISE).quantize(Decimal('0.01'))
+
+
+def percent_of(paise, percent):
+    """Integer percentage of an amount, rounded half up"""
+    return (paise * percent + 50) // 100
+
+
+CartLine = namedtuple('CartLine', 'product_id category_id unit_paise quantity')
+PricedLine = namedtuple('PricedLine', 'product_id category_id unit_paise quantity discount_paise total_paise')
+
+
+class Quote(namedtuple('Quote', 'lines subtotal_paise discount_paise shipping_paise total_paise coupon_code')):
+    """Result of pricing a cart, all amounts in paise"""
+    __slots__ = ()
+
+    @property
+    def subtotal(self):
+        return from_paise(self.subtotal_paise)
+
+    @property
+    def discount(self):
+        return from_paise(self.discount_paise)
+
+    @property
+    def shipping(self):
+        return from_paise(self.shipping_paise)
+
+    @property
+    def total(self):
+        return from_paise(self.total_paise)
+
+
+class InvalidCoupon(Exception):
+    pass
+
+
+class CompiledRules:
+    """Active promotions flattened into lookup tables"""
+
+    def __init__(self, promotions, now):
+        # category_id (None = whole catalog) -> best percentage off
+        self.category_percent = {}
+        # (category_id, buy, get) tuples
+        self.multibuy = []
+        # CODE -> list of (percent_off, amount_off_paise, min_subtotal_paise)
+        self.coupons = {}
+        # Lowest automatic free shipping threshold, and per-code thresholds
+        self.free_shipping_over = None
+        self.coupon_free_shipping = {}
+        # Time at which a scheduled rule starts or ends
+        self.expires_at = None
+
+        for promo in promotions:
+            for boundary in (promo.starts_at, promo.ends_at):
+                if boundary and boundary > now and (self.expires_at is None or boundary < self.expires_at):
+                    self.expires_at = boundary
+            if (promo.starts_at and promo.starts_at > now) or (promo.ends_at and promo.ends_at <= now):
+                continue
+
+            code = promo.code.strip().upper()
+            if promo.kind == Promotion.CATEGORY_PERCENT:
+                current = self.category_percent.get(promo.category_id, 0)
+                self.category_percent[promo.category_id] = max(current, min(promo.percent_off, 100))
+            elif promo.kind == Promotion.BUY_N_GET_M:
+                if promo.buy_quantity and promo.get_quantity:
+                    self.multibuy.append((promo.category_id, promo.buy_quantity, promo.get_quantity))
+            elif promo.kind == Promotion.COUPON:
+                self.coupons.setdefault(code, []).append(
+                    (min(promo.percent_off, 100), promo.amount_off_paise, promo.min_subtotal_paise)
+                )
+            elif promo.kind == Promotion.FREE_SHIPPING:
+                if code:
+                    self.coupon_free_shipping[code] = promo.min_subtotal_paise
+                elif self.free_shipping_over is None or promo.min_subtotal_paise < self.free_shipping_over:
+                    self.free_shipping_over = promo.min_subtotal_paise
+
+    def is_coupon(self, code):
+        return code in self.coupons or code in self.coupon_free_shipping
+
+    def line_percent(self, category_id):
+        return max(self.category_percent.get(category_id, 0), self.category_percent.get(None, 0))
+
+    def multibuy_discount(self, lines, remaining):
+        """Make the cheapest qualifying units free for every buy+get units bought"""
+        discounts = [0] * len(lines)
+        for category_id, buy, get in self.multibuy:
+            eligible = sorted(
+                (line.unit_paise, index) for index, line in enumerate(lines)
+                if category_id is None or line.category_id == category_id
+            )
+            units = sum(lines[index].quantity for _, index in eligible)
+            free_units = units // (buy + get) * get
+            for _, index in eligible:
+                if not free_units:
+                    break
+                take = min(free_units, lines[index].quantity)
+                free_units -= take
+                # Free units are worth what they cost after the line's percentage off
+                free_paise = remaining[index] * take // lines[index].quantity
+                discounts[index] = max(discounts[index], free_paise)
+        return discounts
+
+    def price(self, lines, coupon_code=''):
+        code = (coupon_code or '').strip().upper()
+        if code and not self.is_coupon(code):
+            raise InvalidCoupon(coupon_code)
+
+        remaining = []
+        line_discounts = []
+        for line in lines:
+            gross = line.unit_paise * line.quantity
+            discount = percent_of(gross, self.line_percent(line.category_id))
+            line_discounts.append(discount)
+            remaining.append(gross - discount)
+
+        if self.multibuy:
+            for index, extra in enumerate(self.multibuy_discount(lines, remaining)):
+                line_discounts[index] += extra
+                remaining[index] -= extra
+
+        priced = [
+            PricedLine(line.product_id, line.category_id, line.unit_paise, line.quantity,
+                       line_discounts[index], remaining[index])
+            for index, line in enumerate(lines)
+        ]
+        subtotal = sum(line.unit_paise * line.quantity for line in lines)
+        discount = sum(line_discounts)
+        after_lines = subtotal - discount
+
+        coupon_discount = 0
+        for percent, amount, minimum in self.coupons.get(code, ()):
+            if after_lines >= minimum:
+                coupon_discount = max(coupon_discount, percent_of(after_lines, percent) + amount)
+        coupon_discount = min(coupon_discount, after_lines)
+        discount += coupon_discount
+        after_discount = after_lines - coupon_discount
+
+        shipping = settings.SHIPPING_FEE_PAISE if lines else 0
+        thresholds = [t for t in (self.free_shipping_over, self.coupon_free_shipping.get(code)) if t is not None]
+        if thresholds and after_discount >= min(thresholds):
+            shipping = 0
+
+        return Quote(priced, subtotal, discount, shipping, after_discount + shipping, code)
+
+
+_lock = threading.Lock()
+_compiled = None
+_compiled_at = 0.0
+
+
+def get_rules():
+    """Return the compiled rules, recompiling when they have gone stale"""
+    global _compiled, _compiled_at
+    now = timezone.now()
+    rules = _compiled
+    if (
+        rules is None
+        or time.monotonic() - _compiled_at > settings.PROMOTION_REFRESH_SECONDS
+        or (rules.expires_at is not None and now >= rules.expires_at)
+    ):
+        with _lock:
+            rules = CompiledRules(Promotion.objects.filter(active=True), now)
+            _compiled = rules
+            _compiled_at = time.monotonic()
+    return rules
+
+
+def invalidate_rules():
+    global _compiled
+    _compiled = None
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def promotion_changed(sender, **kwargs):
+    invalidate_rules()
+
+
+def price_lines(lines, coupon_code=''):
+    """Price an iterable of CartLine tuples"""
+    return get_rules().price(list(lines), coupon_code)
+
+
+def cart_lines(items):
+    """CartLine tuples for CartItems loaded with select_related('product')"""
+    return [
+        CartLine(item.product_id, item.product.category_id, to_paise(item.product.price), item.quantity)
+        for item in items
+    ]
+
+
+def price_cart(cart, coupon_code=''):
+    return price_lines(cart_lines(cart.items.select_related('product')), coupon_code)
+
+
+def price_product(product, quantity, coupon_code=''):
+    return price_lines([CartLine(product.id, product.category_id, to_paise(product.price), quantity)], coupon_code)
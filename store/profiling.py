@@ -0,0 +1,108 @@
+# store/profiling.py
+"""
+Production request profiling.
+
+ProfilingMiddleware runs cProfile around a request when it is picked by
+PROFILE_SAMPLE_RATE, or when a staff user sends the `X-Profile: 1`
+header. Each profile is written to PROFILE_DIR as
+`<timestamp>-<url name>-<milliseconds>ms.prof` and only the newest
+PROFILE_KEEP files are kept. `python manage.py profile_report` merges
+them into the hottest functions across requests.
+
+Only one request per process is profiled at a time: cProfile cannot run
+two profilers at once on Python 3.12+, and the overhead should stay on
+the sampled request only. Requests that are not picked cost one random().
+"""
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+
+_active = threading.Lock()
+
+
+def profile_path(url_name, elapsed_ms):
+    stamp = time.strftime('%Y%m%d-%H%M%S') + f'{time.time() % 1:.6f}'[1:]
+    return os.path.join(settings.PROFILE_DIR, f'{stamp}-{url_name}-{elapsed_ms:.0f}ms.prof')
+
+
+def parse_profile_name(filename):
+    """(url name, milliseconds) from a profile file name, or None"""
+    stem, ext = os.path.splitext(os.path.basename(filename))
+    parts = stem.split('-')
+    if ext != '.prof' or len(parts) < 4 or not parts[-1].endswith('ms'):
+        return None
+    try:
+        return '-'.join(parts[2:-1]), float(parts[-1][:-2])
+    except ValueError:
+        return None
+
+
+def profile_files():
+    """Saved profiles, oldest first"""
+    try:
+        names = sorted(name for name in os.listdir(settings.PROFILE_DIR) if name.endswith('.prof'))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(settings.PROFILE_DIR, name) for name in names]
+
+
+def rotate():
+    for path in profile_files()[:-settings.PROFILE_KEEP or None]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def wants_profile(self, request):
+        if request.META.get(HEADER) == '1':
+            user = getattr(request, 'user', None)
+            return bool(user and user.is_staff)
+        return settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.wants_profile(request) or not _active.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler (a debugger, coverage) owns the hook
+                return self.get_response(request)
+            started = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        finally:
+            _active.release()
+
+        match = request.resolver_match
+        url_name = (match.url_name if match else None) or 'unresolved'
+        try:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            path = profile_path(url_name, elapsed_ms)
+            profiler.dump_stats(path)
+            rotate()
+        except OSError:
+            logger.exception('Could not save request profile')
+        else:
+            if request.META.get(HEADER) == '1':
+                response['X-Profile-File'] = os.path.basename(path)
+        return response
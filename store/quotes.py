@@ -0,0 +1,115 @@
+# store/quotes.py
+"""
+Checkout quotes: what a Razorpay order was created to pay for.
+
+When payment starts, the priced lines, the shipping details and the totals
+are written once to a CheckoutQuote keyed by the Razorpay order id instead
+of into the session, which kept the session row growing and being
+rewritten, and tied the callback to the browser that started the payment.
+The payment callback turns the quote into an Order and its items without
+reading the cart or the products again, and reconcile_payments can do the
+same for a payment whose callback never arrived.
+
+Quotes are kept for CHECKOUT_QUOTE_KEEP_DAYS (so retried callbacks and
+reconciliation still find them) and then removed by purge_quotes.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CartItem, CheckoutQuote, Order, OrderItem
+from .pricing import from_paise
+from .rankings import record_sales
+from .reservations import convert
+from .tasks import enqueue
+
+# Buy now collects the address after payment
+PENDING_ADDRESS = {
+    'address': 'Pending - Will be collected separately',
+    'city': 'Pending',
+    'postal_code': '000000',
+}
+
+
+def save_quote(razorpay_order_id, flow, lines, quote, customer, user=None, cart=None):
+    """
+    Save a priced Quote for (product, size, quantity) lines. `customer` has
+    the Order name, email and address fields; `cart` is emptied once paid.
+    """
+    return CheckoutQuote.objects.create(
+        razorpay_order_id=razorpay_order_id,
+        flow=flow,
+        user=user,
+        cart=cart,
+        **customer,
+        lines=[
+            {
+                'product_id': product.id,
+                'size': size,
+                'quantity': quantity,
+                'unit_paise': priced.unit_paise,
+                'discount_paise': priced.discount_paise,
+            }
+            for (product, size, quantity), priced in zip(lines, quote.lines)
+        ],
+        subtotal_paise=quote.subtotal_paise,
+        discount_paise=quote.discount_paise,
+        shipping_paise=quote.shipping_paise,
+        total_paise=quote.total_paise,
+        coupon_code=quote.coupon_code,
+    )
+
+
+def get_quote(razorpay_order_id):
+    return CheckoutQuote.objects.filter(razorpay_order_id=razorpay_order_id).first()
+
+
+def place_order(quote, payment_id, signature=None):
+    """
+    Create the paid Order for a quote, turn its stock holds into sales and
+    empty its cart. Raises IntegrityError if the order already exists.
+    """
+    with transaction.atomic():
+        order = Order.objects.create(
+            user_id=quote.user_id,
+            first_name=quote.first_name,
+            last_name=quote.last_name,
+            email=quote.email,
+            address=quote.address,
+            city=quote.city,
+            postal_code=quote.postal_code,
+            paid=True,
+            payment_id=payment_id,
+            razorpay_order_id=quote.razorpay_order_id,
+            payment_signature=signature,
+            total_amount=from_paise(quote.total_paise),
+            discount_amount=from_paise(quote.discount_paise),
+            shipping_amount=from_paise(quote.shipping_paise),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=line['product_id'],
+                price=from_paise(line['unit_paise']),
+                quantity=line['quantity'],
+                size=line['size'],
+            )
+            for line in quote.lines
+        ])
+        record_sales((line['product_id'], line['quantity']) for line in quote.lines)
+        convert(quote.razorpay_order_id)
+        if quote.cart_id:
+            CartItem.objects.filter(cart_id=quote.cart_id).delete()
+
+        # Side effects run in the background worker
+        enqueue('send_order_confirmation', order_id=order.id)
+    return order
+
+
+def purge_quotes():
+    """Delete quotes older than CHECKOUT_QUOTE_KEEP_DAYS, returning how many"""
+    cutoff = timezone.now() - timedelta(days=settings.CHECKOUT_QUOTE_KEEP_DAYS)
+    deleted, _ = CheckoutQuote.objects.filter(created__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,54 @@
+# store/rankings.py
+"""
+Best-seller and trending counters on Product.
+
+units_sold and trending_score are bumped with F() expressions in the same
+transaction that creates an order, so listings can sort by an index on
+either column instead of aggregating OrderItem. trending_score decays
+exponentially: refresh_trending multiplies every score by the decay for
+the time since its last run, which keeps recent sales worth more.
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import JobCheckpoint, Product
+
+CHECKPOINT = 'trending'
+
+
+def record_sales(lines):
+    """Add sold quantities from (product_id, quantity) pairs to the counters"""
+    totals = defaultdict(int)
+    for product_id, quantity in lines:
+        totals[product_id] += quantity
+
+    # One UPDATE per distinct quantity rather than one per product
+    by_quantity = defaultdict(list)
+    for product_id, quantity in totals.items():
+        by_quantity[quantity].append(product_id)
+    for quantity, product_ids in by_quantity.items():
+        Product.objects.filter(id__in=product_ids).update(
+            units_sold=F('units_sold') + quantity,
+            trending_score=F('trending_score') + quantity,
+        )
+
+
+def decay_trending(now=None):
+    """Decay trending scores for the time elapsed since the last run"""
+    now = now or time.time()
+    with transaction.atomic():
+        last_run = float(JobCheckpoint.get_position(CHECKPOINT, '0'))
+        JobCheckpoint.set_position(CHECKPOINT, now)
+        if not last_run:
+            return 0
+        half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+        factor = 0.5 ** ((now - last_run) / half_life)
+        # Scores too small to matter are zeroed so they stop being rewritten
+        Product.objects.filter(trending_score__gt=0, trending_score__lt=0.01).update(trending_score=0)
+        return Product.objects.filter(trending_score__gt=0).update(
+            trending_score=F('trending_score') * factor
+        )
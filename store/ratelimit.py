@@ -0,0 +1,99 @@
+# store/ratelimit.py
+"""
+Fixed window rate limiting for views.
+
+Each client gets a counter per window (a minute for '30/m') in the cache
+named by RATELIMIT_CACHE, so with a shared backend (Redis, Memcached,
+database cache) the limit applies across all worker processes. Counting
+uses cache.add() and cache.incr(), which are atomic on those backends, so
+concurrent workers cannot spend the same slot. A client can still make up
+to twice the rate across a window boundary.
+
+Anonymous clients are told apart by IP address. Anyone can send a
+made-up session cookie, so keying on it would give every request a fresh
+window, and checking it is real means loading the session from the
+database. The check runs before the view body, so a rejected request
+costs a cache add and incr and no database or gateway work.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Parse '30/m' into (requests allowed per window, window length in seconds)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[-1]] * int(period[:-1] or 1)
+
+
+def client_ip(request):
+    value = request.META.get(settings.RATELIMIT_IP_HEADER, '') or request.META.get('REMOTE_ADDR', '')
+    # Each proxy appends the address it got the request from to
+    # X-Forwarded-For style headers, so the entry the outermost of our
+    # RATELIMIT_PROXIES added is the client; anything before it is whatever
+    # the client sent
+    entries = [entry.strip() for entry in value.split(',')]
+    return entries[-min(max(settings.RATELIMIT_PROXIES, 1), len(entries))]
+
+
+def user_or_ip(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{client_ip(request)}'
+
+
+KEY_FUNCTIONS = {
+    'ip': lambda request: f'ip:{client_ip(request)}',
+    'user_or_ip': user_or_ip,
+}
+
+
+def count_request(name, identity, rate):
+    """Count one request in the current window. Returns seconds to wait, or 0 if allowed"""
+    limit, window = parse_rate(rate)
+    cache = caches[settings.RATELIMIT_CACHE]
+    now = time.time()
+    started = now - now % window
+    key = f'ratelimit:{name}:{identity}:{int(started)}'
+    timeout = int(window) + 1
+
+    cache.add(key, 0, timeout=timeout)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Evicted or expired between add() and incr()
+        cache.add(key, 1, timeout=timeout)
+        count = 1
+    if count > limit:
+        return started + window - now
+    return 0
+
+
+def ratelimit(name, rate, key='ip'):
+    """
+    Limit a view to `rate` requests ('N/s', 'N/m', 'N/h', 'N/d') per client.
+    settings.RATELIMITS[name] overrides the rate; None disables the limit.
+    """
+    key_function = KEY_FUNCTIONS[key]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            view_rate = settings.RATELIMITS.get(name, rate)
+            if settings.RATELIMIT_ENABLED and view_rate:
+                retry_after = count_request(name, key_function(request), view_rate)
+                if retry_after:
+                    response = JsonResponse({
+                        'success': False,
+                        'error': 'Too many requests. Please try again shortly.'
+                    }, status=429)
+                    response['Retry-After'] = str(int(retry_after) + 1)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
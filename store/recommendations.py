@@ -0,0 +1,101 @@
+# store/recommendations.py
+"""
+"Frequently bought together" recommendations.
+
+Co-purchase counts are aggregated inside the database with a self-join of
+OrderItem on order_id, so the work is one set-based statement per step
+instead of a Python loop over order lines. Runs are incremental: only
+orders after the last processed id are counted, their pair counts are
+added to ProductPairCount, and only products that appeared in those
+orders get their top-K list rebuilt.
+
+Order lines are read from OrderItem and ArchivedOrderItem alike. Archived
+orders keep their ids, so a full rebuild counts the same orders as the
+incremental runs before it, and an order archived before any run saw it
+is still counted once.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, JobCheckpoint, Order, OrderItem, ProductPairCount, ProductRecommendation,
+)
+
+CHECKPOINT = 'recommendations'
+
+
+def table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def rebuild(full=False, top_k=None):
+    """Fold new paid orders into the pair counts and refresh affected top-K lists"""
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    items, orders, archived_items = table(OrderItem), table(Order), table(ArchivedOrderItem)
+    pairs, recommendations = table(ProductPairCount), table(ProductRecommendation)
+    # (order_id, product_id) of paid order lines with order ids in (start, end];
+    # every archived order was paid
+    lines = f'''
+        SELECT i.order_id, i.product_id FROM {items} i
+        JOIN {orders} o ON o.id = i.order_id
+        WHERE o.paid AND i.order_id > %s AND i.order_id <= %s
+        UNION ALL
+        SELECT order_id, product_id FROM {archived_items}
+        WHERE order_id > %s AND order_id <= %s
+    '''
+
+    with transaction.atomic():
+        start = 0 if full else int(JobCheckpoint.get_position(CHECKPOINT, '0'))
+        end = max(
+            Order.objects.filter(paid=True).order_by('-id').values_list('id', flat=True).first() or 0,
+            ArchivedOrder.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+        )
+        if end <= start and not full:
+            return 0
+        bounds = [start, end, start, end]
+
+        with connection.cursor() as cursor:
+            if full:
+                cursor.execute(f'DELETE FROM {pairs}')
+                cursor.execute(f'DELETE FROM {recommendations}')
+
+            # Count each pair once per order, whatever the quantities or sizes
+            cursor.execute(f'''
+                INSERT INTO {pairs} (product_id, related_id, orders)
+                SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id)
+                FROM ({lines}) a
+                JOIN ({lines}) b ON b.order_id = a.order_id
+                WHERE b.product_id <> a.product_id
+                GROUP BY a.product_id, b.product_id
+                ON CONFLICT (product_id, related_id)
+                DO UPDATE SET orders = {pairs}.orders + excluded.orders
+            ''', bounds + bounds)
+
+            affected = f'SELECT DISTINCT product_id FROM ({lines}) l'
+            cursor.execute(f'DELETE FROM {recommendations} WHERE product_id IN ({affected})', bounds)
+            cursor.execute(f'''
+                INSERT INTO {recommendations} (product_id, related_id, score, rank)
+                SELECT product_id, related_id, orders, position FROM (
+                    SELECT product_id, related_id, orders,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY product_id ORDER BY orders DESC, related_id
+                           ) AS position
+                    FROM {pairs}
+                    WHERE product_id IN ({affected})
+                ) ranked
+                WHERE position <= %s
+            ''', bounds + [top_k])
+            updated = cursor.rowcount
+
+        JobCheckpoint.set_position(CHECKPOINT, end)
+    return updated
+
+
+def recommended_products(product, limit=4):
+    """Products most often bought with `product`, in one indexed query"""
+    return [
+        recommendation.related
+        for recommendation in product.recommendations
+        .filter(related__available=True)
+        .select_related('related')[:limit]
+    ]
@@ -0,0 +1,149 @@
+# store/reconciliation.py
+"""
+Reconcile captured Razorpay payments against orders.
+
+A payment whose browser never reached the success callback has no Order.
+reconcile() pages through the gateway's payments for a time window,
+fetching up to `workers` pages at once, and checks each page against
+Order and ArchivedOrder with one set-based lookup on razorpay_order_id.
+For a captured payment with no order:
+
+- if its CheckoutQuote is still kept, the order is placed from it just
+  as the callback would have, and the payment is recorded as RECOVERED;
+- otherwise it is recorded as NO_ITEMS for staff to follow up.
+
+Matched orders whose total differs from the amount paid are recorded as
+AMOUNT_MISMATCH. Runs pick up from the end of the previous window in
+JobCheckpoint, re-reading PAYMENT_RECONCILE_OVERLAP_MINUTES so payments
+captured late are not missed; rerunning a window changes nothing.
+"""
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError
+
+from . import payments
+from .models import ArchivedOrder, CheckoutQuote, JobCheckpoint, Order, UnmatchedPayment
+from .pricing import to_paise
+from .quotes import place_order
+
+CHECKPOINT = 'payment_reconciliation'
+PAGE_SIZE = 100  # The most Razorpay returns per request
+
+
+def pages(fetch, since, until, page_size=PAGE_SIZE, workers=4):
+    """Yield pages of payments in order, with up to `workers` requests in flight"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque(
+            pool.submit(fetch, since, until, skip, page_size)
+            for skip in range(0, workers * page_size, page_size)
+        )
+        next_skip = workers * page_size
+        while in_flight:
+            page = in_flight.popleft().result()
+            if page:
+                yield page
+            if len(page) < page_size:
+                # Past the end: pages still in flight are empty
+                for future in in_flight:
+                    future.cancel()
+                return
+            in_flight.append(pool.submit(fetch, since, until, next_skip, page_size))
+            next_skip += page_size
+
+
+def known_orders(razorpay_order_ids):
+    """{razorpay order id: total_amount} for live and archived orders, in one query"""
+    live = Order.objects.filter(razorpay_order_id__in=razorpay_order_ids).order_by()
+    archived = ArchivedOrder.objects.filter(razorpay_order_id__in=razorpay_order_ids).order_by()
+    return dict(
+        live.values_list('razorpay_order_id', 'total_amount')
+        .union(archived.values_list('razorpay_order_id', 'total_amount'), all=True)
+    )
+
+
+def payment_email(payment):
+    notes = payment.get('notes') or {}
+    if not isinstance(notes, dict):
+        notes = {}  # Razorpay sends [] when there are none
+    return payment.get('email') or notes.get('email') or ''
+
+
+def reconcile_page(page):
+    """Check one page of payments, returning a Counter of outcomes"""
+    outcomes = Counter(payments=len(page))
+    captured = [payment for payment in page if payment.get('status') == 'captured' and payment.get('order_id')]
+    known = known_orders({payment['order_id'] for payment in captured})
+
+    flagged = []
+    missing = []
+    for payment in captured:
+        if payment['order_id'] not in known:
+            missing.append(payment)
+            continue
+        outcomes['matched'] += 1
+        total = known[payment['order_id']]
+        # Buy now orders created before totals were recorded have none
+        if total and to_paise(total) != payment['amount']:
+            flagged.append(UnmatchedPayment(reason=UnmatchedPayment.AMOUNT_MISMATCH, **flag_fields(payment)))
+
+    quotes = {}
+    if missing:
+        quotes = CheckoutQuote.objects.in_bulk(
+            [payment['order_id'] for payment in missing], field_name='razorpay_order_id'
+        )
+
+    for payment in missing:
+        quote = quotes.get(payment['order_id'])
+        if quote is None:
+            flagged.append(UnmatchedPayment(reason=UnmatchedPayment.NO_ITEMS, **flag_fields(payment)))
+            continue
+        try:
+            order = place_order(quote, payment['id'])
+        except IntegrityError:
+            # The payment callback created it in the meantime
+            outcomes['matched'] += 1
+            continue
+        flagged.append(UnmatchedPayment(reason=UnmatchedPayment.RECOVERED, order=order, **flag_fields(payment)))
+
+    # Payments already flagged by an earlier, overlapping run are skipped
+    UnmatchedPayment.objects.bulk_create(flagged, ignore_conflicts=True)
+    for flag in flagged:
+        outcomes[flag.reason] += 1
+    return outcomes
+
+
+def flag_fields(payment):
+    return {
+        'payment_id': payment['id'],
+        'razorpay_order_id': payment['order_id'],
+        'amount_paise': payment['amount'],
+        'email': payment_email(payment),
+    }
+
+
+def reconcile(since=None, until=None, fetch=None, workers=None, page_size=PAGE_SIZE):
+    """
+    Reconcile payments created between two unix timestamps, by default
+    from where the last run ended to PAYMENT_RECONCILE_DELAY_MINUTES ago,
+    and record the end of the window. Returns a Counter of outcomes.
+    """
+    fetch = fetch or payments.list_payments
+    workers = workers or settings.PAYMENT_RECONCILE_WORKERS
+    resume = since is None and until is None
+    until = until or int(time.time()) - settings.PAYMENT_RECONCILE_DELAY_MINUTES * 60
+    if since is None:
+        last_until = int(JobCheckpoint.get_position(CHECKPOINT, '0'))
+        if last_until:
+            since = last_until - settings.PAYMENT_RECONCILE_OVERLAP_MINUTES * 60
+        else:
+            since = until - settings.PAYMENT_RECONCILE_FIRST_RUN_HOURS * 3600
+
+    outcomes = Counter()
+    for page in pages(fetch, since, until, page_size, workers):
+        outcomes.update(reconcile_page(page))
+    if resume:
+        JobCheckpoint.set_position(CHECKPOINT, until)
+    return outcomes
@@ -0,0 +1,160 @@
+# store/reservations.py
+"""
+Stock holds for pending Razorpay payments.
+
+Product.stock_reserved counts the units held by open reservations, so
+checking and taking a hold is a single conditional UPDATE on the product
+rows (stock >= stock_reserved + quantity) rather than a scan of open
+reservations. Quantities go in per product as a CASE expression, so a
+cart of any size takes, converts or gives back its holds in one UPDATE.
+A hold turns into a sale when the payment succeeds, or is released back
+by release_expired once STOCK_HOLD_MINUTES have passed. A shopper who
+starts paying again (a second click, or a changed cart) gets new holds, and
+release_orders gives back the ones taken for the Razorpay orders they left.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+class OutOfStock(Exception):
+    def __init__(self, product):
+        self.product = product
+        available = max(product.available_stock, 0)
+        super().__init__(f'Only {available} left of {product.name}' if available else f'{product.name} is sold out')
+
+
+def per_product(quantities):
+    """CASE expression giving each product's quantity from {product id: quantity}"""
+    return Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def reserve(lines):
+    """
+    Hold stock for (product, size, quantity) lines. Raises OutOfStock and
+    holds nothing if any product cannot cover its quantity.
+    """
+    totals = defaultdict(int)
+    products = {}
+    for product, size, quantity in lines:
+        totals[product.id] += quantity
+        products[product.id] = product
+
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_HOLD_MINUTES)
+    with transaction.atomic():
+        held = Product.objects.filter(
+            id__in=totals,
+            stock__gte=F('stock_reserved') + per_product(totals)
+        ).update(stock_reserved=F('stock_reserved') + per_product(totals))
+        if held == len(totals):
+            return StockReservation.objects.bulk_create([
+                StockReservation(product=product, size=size, quantity=quantity, expires_at=expires_at)
+                for product, size, quantity in lines
+            ])
+        # Some product fell short: give back the holds that were taken
+        transaction.set_rollback(True)
+
+    current = Product.objects.only('stock', 'stock_reserved').in_bulk(totals)
+    for product_id, quantity in totals.items():
+        product = products[product_id]
+        if product_id in current:
+            product.stock = current[product_id].stock
+            product.stock_reserved = current[product_id].stock_reserved
+        if product_id not in current or product.available_stock < quantity:
+            raise OutOfStock(product)
+    # Stock was added back since the UPDATE; report the first product
+    raise OutOfStock(products[next(iter(totals))])
+
+
+def assign(reservations, razorpay_order_id):
+    """Link holds taken before the gateway call to the Razorpay order"""
+    StockReservation.objects.filter(id__in=[r.id for r in reservations]).update(
+        razorpay_order_id=razorpay_order_id
+    )
+
+
+def _return_to_stock(rows):
+    totals = defaultdict(int)
+    for product_id, quantity in rows:
+        totals[product_id] += quantity
+    if totals:
+        Product.objects.filter(id__in=totals).update(stock_reserved=F('stock_reserved') - per_product(totals))
+
+
+def _release(holds):
+    with transaction.atomic():
+        rows = list(
+            holds.select_for_update()
+            .filter(status=StockReservation.HELD)
+            .values_list('id', 'product_id', 'quantity')
+        )
+        StockReservation.objects.filter(id__in=[row[0] for row in rows]).update(status=StockReservation.RELEASED)
+        _return_to_stock(row[1:] for row in rows)
+    return len(rows)
+
+
+def release(reservations):
+    """Give back holds whose gateway order could not be created"""
+    _release(StockReservation.objects.filter(id__in=[r.id for r in reservations]))
+
+
+def release_orders(razorpay_order_ids):
+    """
+    Give back the open holds for Razorpay orders that were replaced by a
+    new one, returning how many were released. Holds already sold are kept.
+    """
+    razorpay_order_ids = [order_id for order_id in razorpay_order_ids if order_id]
+    if not razorpay_order_ids:
+        return 0
+    return _release(StockReservation.objects.filter(razorpay_order_id__in=razorpay_order_ids))
+
+
+def convert(razorpay_order_id):
+    """Turn the holds for a paid Razorpay order into sold stock"""
+    with transaction.atomic():
+        rows = list(
+            StockReservation.objects.select_for_update()
+            .filter(razorpay_order_id=razorpay_order_id)
+            .exclude(status=StockReservation.CONVERTED)
+            .values_list('id', 'product_id', 'quantity', 'status')
+        )
+        StockReservation.objects.filter(id__in=[row[0] for row in rows]).update(status=StockReservation.CONVERTED)
+        held, expired = defaultdict(int), defaultdict(int)
+        for _, product_id, quantity, status in rows:
+            # Paid after the hold expired: the units were already given back
+            (held if status == StockReservation.HELD else expired)[product_id] += quantity
+        if held:
+            Product.objects.filter(id__in=held).update(
+                stock=F('stock') - per_product(held),
+                stock_reserved=F('stock_reserved') - per_product(held)
+            )
+        if expired:
+            Product.objects.filter(id__in=expired).update(stock=F('stock') - per_product(expired))
+
+
+def release_expired(batch_size=500):
+    """Release expired holds in batches, returning how many were released"""
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                StockReservation.objects.select_for_update()
+                .filter(status=StockReservation.HELD, expires_at__lte=timezone.now())
+                .values_list('id', 'product_id', 'quantity')[:batch_size]
+            )
+            if not rows:
+                return released
+            StockReservation.objects.filter(id__in=[row[0] for row in rows]).update(
+                status=StockReservation.RELEASED
+            )
+            _return_to_stock(row[1:] for row in rows)
+        released += len(rows)
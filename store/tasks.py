@@ -0,0 +1,130 @@
+# store/tasks.py
+"""
+A small task queue stored in the Task table.
+
+Tasks are enqueued inside the caller's transaction, so a task exists if
+and only if the work that triggered it was committed. Workers claim tasks
+with a conditional UPDATE and hold them for TASK_LEASE_SECONDS; a task
+whose worker dies is claimed again once the lease runs out. Delivery is
+therefore at-least-once and task functions must be safe to repeat. A
+worker whose lease ran out only records the outcome if no other worker
+has claimed the task since.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Order, Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(func):
+    """Register a function so it can be enqueued by name"""
+    registry[func.__name__] = func
+    return func
+
+
+def enqueue(name, delay=0, max_attempts=None, **payload):
+    """Queue task `name` to run with `payload` as keyword arguments"""
+    if name not in registry:
+        raise KeyError(f'Unknown task: {name}')
+    return Task.objects.create(
+        name=name,
+        payload=payload,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts"""
+    return min(settings.TASK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.TASK_RETRY_MAX_SECONDS)
+
+
+def claim(limit):
+    """Claim up to `limit` due tasks for this worker"""
+    now = timezone.now()
+    candidates = (
+        Task.objects.filter(
+            Q(status=Task.PENDING, run_at__lte=now)
+            | Q(status=Task.RUNNING, locked_until__lt=now)
+        )
+        .order_by('run_at')
+        .values_list('id', 'status', 'attempts')[:limit]
+    )
+    lease = now + timedelta(seconds=settings.TASK_LEASE_SECONDS)
+    claimed = []
+    for task_id, status, attempts in candidates:
+        # Only one worker can move the row on from the state it read
+        won = Task.objects.filter(id=task_id, status=status, attempts=attempts).update(
+            status=Task.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=lease,
+            updated=now,
+        )
+        if won:
+            claimed.append(task_id)
+    return Task.objects.filter(id__in=claimed).order_by('run_at')
+
+
+def finish(job, **fields):
+    """Record how a claimed task ended, unless another worker has claimed it since"""
+    updated = Task.objects.filter(id=job.id, attempts=job.attempts).update(
+        locked_until=None, updated=timezone.now(), **fields
+    )
+    if not updated:
+        logger.warning('Task %s was claimed again before attempt %s finished', job, job.attempts)
+
+
+def run_task(job):
+    func = registry.get(job.name)
+    try:
+        if func is None:
+            raise KeyError(f'Unknown task: {job.name}')
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Task %s failed (attempt %s)', job, job.attempts)
+        if job.attempts >= job.max_attempts:
+            finish(job, status=Task.FAILED, last_error=error)
+        else:
+            finish(
+                job,
+                status=Task.PENDING,
+                last_error=error,
+                run_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+            )
+        return False
+
+    finish(job, status=Task.DONE)
+    return True
+
+
+def run_pending(limit=10):
+    """Run one batch of due tasks, returning how many were claimed"""
+    jobs = list(claim(limit))
+    for job in jobs:
+        run_task(job)
+    return len(jobs)
+
+
+@task
+def send_order_confirmation(order_id):
+    """Email the customer a summary of their paid order"""
+    order = Order.objects.prefetch_related('items__product').get(id=order_id)
+    message = render_to_string('store/emails/order_confirmation.txt', {'order': order})
+    send_mail(
+        f'Your Loom State order #{order.id}',
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [order.email],
+    )
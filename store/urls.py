@@ -1,27 +1,39 @@
 # store/urls.py - Make sure this exists
 from django.urls import path
-from . import views
+from .views import accounts, cart, catalog, checkout, feeds, monitoring, orders
 
 app_name = 'store'
 
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('product/<int:id>/<slug:slug>/', views.product_detail, name='product_detail'),
-    path('cart/', views.cart_detail, name='cart_detail'),
-    path('cart/add/', views.cart_add, name='cart_add'),
-    path('cart/add/ajax/', views.add_to_cart_ajax, name='add_to_cart_ajax'),
-    path('cart/remove/', views.cart_remove, name='cart_remove'),
-    path('cart/update/', views.cart_update, name='cart_update'),
-    path('checkout/', views.checkout, name='checkout'),
-    path('order/<int:order_id>/', views.order_confirmation, name='order_confirmation'),  # This line is critical
-    path('signup/', views.signup_view, name='signup'),
-    path('login/', views.login_view, name='login'),
-    path('logout/', views.logout_view, name='logout'),
+    path('', catalog.home, name='home'),
+    path('product/<int:id>/<slug:slug>/', catalog.product_detail, name='product_detail'),
+    path('search/autocomplete/', catalog.autocomplete, name='autocomplete'),
+    path('cart/', cart.cart_detail, name='cart_detail'),
+    path('cart/add/', cart.cart_add, name='cart_add'),
+    path('cart/add/ajax/', cart.add_to_cart_ajax, name='add_to_cart_ajax'),
+    path('cart/remove/', cart.cart_remove, name='cart_remove'),
+    path('cart/update/', cart.cart_update, name='cart_update'),
+    path('cart/batch/', cart.cart_batch, name='cart_batch'),
+    path('checkout/', checkout.checkout, name='checkout'),
+    path('order/<int:order_id>/', orders.order_confirmation, name='order_confirmation'),  # This line is critical
+    path('orders/', orders.order_history, name='order_history'),
+    path('orders/<int:order_id>/', orders.order_detail, name='order_detail'),
+    path('signup/', accounts.signup_view, name='signup'),
+    path('login/', accounts.login_view, name='login'),
+    path('logout/', accounts.logout_view, name='logout'),
+    
+    # Shopping channel feeds and sitemap
+    path('feeds/products.<str:format>', feeds.product_feed, name='product_feed'),
+    path('sitemap.xml', feeds.sitemap_index, name='sitemap'),
+    path('sitemap-products-<int:page>.xml', feeds.sitemap_products, name='sitemap_products'),
+    
+    # Monitoring
+    path('metrics/', monitoring.metrics_view, name='metrics'),
     
     # Razorpay endpoints
-    path('create-razorpay-order/', views.create_razorpay_order, name='create_razorpay_order'),
-    path('create-checkout-order/', views.create_checkout_order, name='create_checkout_order'),
-    path('payment-success/', views.payment_success, name='payment_success'),
-    path('checkout-payment-success/', views.checkout_payment_success, name='checkout_payment_success'),
-    path('buy-now/', views.buy_now, name='buy_now'),
+    path('create-razorpay-order/', checkout.create_razorpay_order, name='create_razorpay_order'),
+    path('create-checkout-order/', checkout.create_checkout_order, name='create_checkout_order'),
+    path('payment-success/', checkout.payment_success, name='payment_success'),
+    path('checkout-payment-success/', checkout.checkout_payment_success, name='checkout_payment_success'),
+    path('buy-now/', checkout.buy_now, name='buy_now'),
 ]
\ No newline at end of file
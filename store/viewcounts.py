@@ -0,0 +1,77 @@
+# store/viewcounts.py
+"""
+Write-behind product view counters.
+
+product_detail only bumps an in-memory Counter, so a page view costs no
+database write. A background thread in each worker (store/flusher.py)
+flushes the counts every VIEW_COUNT_FLUSH_SECONDS with one
+`views = views + n` UPDATE per distinct n, and the remainder is flushed
+at interpreter exit so a graceful shutdown loses nothing. A worker that
+is killed outright loses at most one interval of views, which is
+acceptable for merchandising.
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.db import DatabaseError, connection
+from django.db.models import F
+
+from .flusher import Flusher
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+_pending = Counter()
+_lock = threading.Lock()
+
+
+def record_view(product_id):
+    """Count a view of `product_id`; the write happens on the next flush"""
+    # First, as starting in a forked worker drops the views counted so far
+    _flusher.ensure_started()
+    with _lock:
+        _pending[product_id] += 1
+
+
+def flush():
+    """Write buffered counts to the database, returning how many views were written"""
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return 0
+
+    by_count = defaultdict(list)
+    for product_id, count in pending.items():
+        by_count[count].append(product_id)
+    groups = list(by_count.items())
+    written = 0
+    for done, (count, product_ids) in enumerate(groups):
+        try:
+            Product.objects.filter(id__in=product_ids).update(views=F('views') + count)
+        except DatabaseError:
+            logger.exception('Could not flush product view counts, keeping them for the next flush')
+            with _lock:
+                for unwritten, ids in groups[done:]:
+                    for product_id in ids:
+                        _pending[product_id] += unwritten
+            break
+        written += count * len(product_ids)
+    return written
+
+
+def _flush():
+    flush()
+    # The flusher thread's connection would otherwise stay open between flushes
+    connection.close()
+
+
+def _start(forked):
+    if forked:
+        # Views counted before the fork belong to the parent, which flushes them itself
+        with _lock:
+            _pending.clear()
+
+
+_flusher = Flusher('viewcounts', _flush, 'VIEW_COUNT_FLUSH_SECONDS', on_start=_start)
@@ -0,0 +1,3 @@
+# store/views/__init__.py
+# Views are split by area so that, for example, serving the catalog does not
+# load the checkout code's dependencies. urls.py imports the modules directly.
@@ -0,0 +1,44 @@
+# store/views/accounts.py
+from django.shortcuts import render, redirect
+from django.contrib.auth import login, authenticate, logout
+from django.contrib import messages
+
+from ..forms import SignUpForm, LoginForm
+from .cart import save_guest_cart
+
+def signup_view(request):
+    if request.method == 'POST':
+        form = SignUpForm(request.POST)
+        if form.is_valid():
+            user = form.save()
+            login(request, user)
+            save_guest_cart(request, user)
+            messages.success(request, 'Account created successfully!')
+            return redirect('store:home')
+    else:
+        form = SignUpForm()
+    
+    return render(request, 'registration/signup.html', {'form': form})
+
+def login_view(request):
+    if request.method == 'POST':
+        form = LoginForm(request, data=request.POST)
+        if form.is_valid():
+            username = form.cleaned_data.get('username')
+            password = form.cleaned_data.get('password')
+            user = authenticate(username=username, password=password)
+            if user is not None:
+                login(request, user)
+                save_guest_cart(request, user)
+                
+                messages.success(request, f'Welcome back, {username}!')
+                return redirect('store:home')
+    else:
+        form = LoginForm()
+    
+    return render(request, 'registration/login.html', {'form': form})
+
+def logout_view(request):
+    logout(request)
+    messages.success(request, 'You have been logged out.')
+    return redirect('store:home')
@@ -0,0 +1,280 @@
+# store/views/cart.py
+import json
+
+from django.shortcuts import render, get_object_or_404
+from django.views.decorators.http import require_POST
+from django.http import Http404, JsonResponse
+from django.db import transaction
+
+from ..guest_cart import GuestCart, GuestCartFull, GuestItem
+from ..metrics import CART_ADDS
+from ..models import Product, Cart, CartItem
+from ..ratelimit import ratelimit
+
+def get_cart(request):
+    """The shopper's cart: their Cart row when signed in, else the guest cart cookie"""
+    if request.user.is_authenticated:
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        return cart
+    return request.guest_cart
+
+def get_or_create_cart(request):
+    """The shopper's Cart row; for guests, the one keyed by their session"""
+    if request.user.is_authenticated:
+        cart, created = Cart.objects.get_or_create(user=request.user)
+    else:
+        session_key = request.session.session_key
+        if not session_key:
+            request.session.create()
+            session_key = request.session.session_key
+        cart, created = Cart.objects.get_or_create(session_key=session_key)
+    return cart
+
+def checkout_cart(request):
+    """The Cart row to pay for, first replacing a guest's session cart with their cookie lines"""
+    cart = get_or_create_cart(request)
+    if not request.user.is_authenticated:
+        with transaction.atomic():
+            cart.items.all().delete()
+            request.guest_cart.save_to(cart)
+    return cart
+
+def save_guest_cart(request, user):
+    """Move the lines from the guest cart cookie into the user's cart as they sign in"""
+    if request.guest_cart.lines:
+        cart, created = Cart.objects.get_or_create(user=user)
+        with transaction.atomic():
+            request.guest_cart.save_to(cart)
+        request.guest_cart.clear()
+
+class CartOperationError(Exception):
+    pass
+
+def parse_quantity(value, minimum=1):
+    """A quantity from a request body; CartOperationError if it is not a number or below minimum"""
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise CartOperationError('Quantity must be a whole number')
+    if quantity < minimum:
+        raise CartOperationError(f'Quantity must be at least {minimum}')
+    return quantity
+
+def add_item(cart, product, size, quantity):
+    if quantity < 1:
+        raise CartOperationError('Quantity must be at least 1')
+    if size not in product.available_sizes():
+        raise CartOperationError('Product is not available in that size')
+    if isinstance(cart, GuestCart):
+        cart.add(product, size, quantity)
+        return
+    cart_item, created = CartItem.objects.get_or_create(
+        cart=cart,
+        product=product,
+        size=size,
+        defaults={'quantity': quantity}
+    )
+    if not created:
+        cart_item.quantity += quantity
+        cart_item.save()
+
+def cart_detail(request):
+    cart = get_cart(request)
+    return render(request, 'store/cart.html', {'cart': cart})
+
+@require_POST
+@ratelimit('add_to_cart', '30/m')
+def add_to_cart_ajax(request):
+    """AJAX endpoint to add item to cart without page reload"""
+    try:
+        data = json.loads(request.body)
+        product_id = data.get('product_id')
+        quantity = parse_quantity(data.get('quantity', 1))
+        size = data.get('size')
+        
+        product = get_object_or_404(Product, id=product_id)
+        cart = get_cart(request)
+        add_item(cart, product, size, quantity)
+        CART_ADDS.inc(view='add_to_cart_ajax')
+        
+        return JsonResponse({
+            'success': True,
+            'message': 'Product added to cart',
+            'cart_total': cart.get_total_items(),
+            'cart_total_price': str(cart.get_total_price())
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+@require_POST
+@ratelimit('add_to_cart', '30/m')
+def cart_add(request):
+    data = json.loads(request.body)
+    product_id = data.get('product_id')
+    size = data.get('size')
+    try:
+        quantity = parse_quantity(data.get('quantity', 1))
+    except CartOperationError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    product = get_object_or_404(Product, id=product_id)
+    cart = get_cart(request)
+    try:
+        add_item(cart, product, size, quantity)
+    except (CartOperationError, GuestCartFull) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    CART_ADDS.inc(view='cart_add')
+    
+    return JsonResponse({
+        'success': True,
+        'cart_total': cart.get_total_items(),
+        'cart_total_price': str(cart.get_total_price())
+    })
+
+@require_POST
+def cart_remove(request):
+    data = json.loads(request.body)
+    item_id = data.get('item_id')
+    
+    cart = get_cart(request)
+    if isinstance(cart, GuestCart):
+        removed = cart.update(item_id, 0)
+    else:
+        removed, _ = CartItem.objects.filter(id=item_id, cart=cart).delete()
+    if not removed:
+        raise Http404('Item is not in your cart')
+    
+    return JsonResponse({
+        'success': True,
+        'cart_total': cart.get_total_items(),
+        'cart_total_price': str(cart.get_total_price())
+    })
+
+@require_POST
+def cart_update(request):
+    data = json.loads(request.body)
+    item_id = data.get('item_id')
+    try:
+        quantity = parse_quantity(data.get('quantity'), minimum=0)
+    except CartOperationError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    cart = get_cart(request)
+    if isinstance(cart, GuestCart):
+        updated = cart.update(item_id, quantity)
+    elif quantity:
+        updated = CartItem.objects.filter(id=item_id, cart=cart).update(quantity=quantity)
+    else:
+        # Zero removes the line, as it does in a guest cart
+        updated, _ = CartItem.objects.filter(id=item_id, cart=cart).delete()
+    if not updated:
+        raise Http404('Item is not in your cart')
+    cart_item = next((item for item in cart.get_items() if str(item.id) == str(item_id)), None)
+    
+    return JsonResponse({
+        'success': True,
+        'item_total': str(cart_item.get_cost() if cart_item else 0),
+        'cart_total': cart.get_total_items(),
+        'cart_total_price': str(cart.get_total_price())
+    })
+
+CART_MAX_QUANTITY = 10
+CART_MAX_OPERATIONS = 50
+
+def apply_cart_operations(cart, operations):
+    """
+    Apply add/update/remove operations to a cart in memory, then write the
+    result with at most one DELETE, one bulk UPDATE and one bulk INSERT.
+    Guest carts are edited the same way and written back to their cookie.
+    Returns the cart's items after the change.
+    """
+    guest = isinstance(cart, GuestCart)
+    items = list(cart.get_items() if guest else cart.items.select_related('product'))
+    by_id = {str(item.id): item for item in items}
+    by_variant = {(item.product_id, item.size): item for item in items}
+    
+    product_ids = {int(op['product_id']) for op in operations if op.get('op') == 'add'}
+    products = Product.objects.filter(available=True).in_bulk(product_ids) if product_ids else {}
+    
+    removed, changed = set(), set()
+    for op in operations:
+        kind = op.get('op')
+        if kind == 'add':
+            product = products.get(int(op['product_id']))
+            size = op.get('size')
+            if product is None or size not in product.available_sizes():
+                raise CartOperationError('Product is not available in that size')
+            item = by_variant.get((product.id, size))
+            if item is None:
+                if guest:
+                    item = GuestItem(product, size, 0)
+                else:
+                    item = CartItem(cart=cart, product=product, size=size, quantity=0)
+                by_variant[(product.id, size)] = item
+            item.quantity += parse_quantity(op.get('quantity', 1))
+        elif kind in ('update', 'remove'):
+            item = by_id.get(str(op['item_id']))
+            if item is None:
+                raise CartOperationError('Item is not in your cart')
+            item.quantity = parse_quantity(op.get('quantity'), minimum=0) if kind == 'update' else 0
+        else:
+            raise CartOperationError(f'Unknown operation: {kind}')
+        
+        if item.quantity > CART_MAX_QUANTITY:
+            raise CartOperationError(f'You can order at most {CART_MAX_QUANTITY} of an item')
+        changed.add((item.product_id, item.size))
+    
+    if guest:
+        remaining = {variant: item for variant, item in by_variant.items() if item.quantity > 0}
+        try:
+            cart.set_lines({variant: item.quantity for variant, item in remaining.items()})
+        except GuestCartFull as e:
+            raise CartOperationError(str(e))
+        return list(remaining.values())
+    
+    to_delete, to_update, to_create = [], [], []
+    for variant in changed:
+        item = by_variant[variant]
+        if item.quantity <= 0:
+            if item.pk:
+                to_delete.append(item.pk)
+            removed.add(variant)
+        elif item.pk:
+            to_update.append(item)
+        else:
+            to_create.append(item)
+    
+    with transaction.atomic():
+        if to_delete:
+            CartItem.objects.filter(cart=cart, id__in=to_delete).delete()
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+    
+    return [item for variant, item in by_variant.items() if variant not in removed]
+
+@require_POST
+@ratelimit('cart_batch', '60/m')
+def cart_batch(request):
+    """Apply a batch of cart edits in one request and return the new totals once"""
+    try:
+        data = json.loads(request.body)
+        operations = data.get('operations') or []
+        if len(operations) > CART_MAX_OPERATIONS:
+            raise CartOperationError('Too many changes at once')
+        
+        cart = get_cart(request)
+        items = apply_cart_operations(cart, operations)
+    except (CartOperationError, KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    added = sum(1 for op in operations if op.get('op') == 'add')
+    if added:
+        CART_ADDS.inc(added, view='cart_batch')
+    
+    return JsonResponse({
+        'success': True,
+        'items': {str(item.id): str(item.get_cost()) for item in items},
+        'cart_total': sum(item.quantity for item in items),
+        'cart_total_price': str(sum(item.get_cost() for item in items))
+    })
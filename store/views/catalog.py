@@ -0,0 +1,120 @@
+# store/views/catalog.py
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
+from django.http import JsonResponse
+from django.utils.http import urlencode
+
+from ..autocomplete import get_index as get_autocomplete_index
+from ..facets import FACETS, IN_STOCK, PRODUCT_SORTS, get_index
+from ..forms import AddToCartForm
+from ..metrics import CART_ADDS
+from ..guest_cart import GuestCartFull
+from ..models import Product, Category
+from ..recommendations import recommended_products
+from ..viewcounts import record_view
+from .cart import add_item, get_cart
+
+HOME_PAGE_SIZE = 12
+
+def home(request):
+    sort = request.GET.get('sort')
+    if sort not in PRODUCT_SORTS:
+        sort = 'new'
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    filters = {
+        'category': request.GET.getlist('category'),
+        'size': request.GET.getlist('size'),
+        'price': request.GET.getlist('price'),
+        'stock': [IN_STOCK] if request.GET.get('in_stock') else [],
+    }
+    
+    index = get_index()
+    result = index.search(filters, sort, offset=(page - 1) * HOME_PAGE_SIZE, limit=HOME_PAGE_SIZE)
+    # The index can be a little behind, so fetch the page by id and keep its order
+    found = Product.objects.filter(available=True).in_bulk(result.product_ids)
+    products = [found[product_id] for product_id in result.product_ids if product_id in found]
+    
+    facets = [
+        {
+            'name': facet,
+            'label': label,
+            'values': [
+                {
+                    'value': value,
+                    'label': value_label,
+                    'count': result.counts[facet][value],
+                    'selected': value in filters[facet],
+                }
+                for value, value_label in index.labels[facet].items()
+            ],
+        }
+        for facet, label in FACETS
+    ]
+    filter_query = urlencode(
+        [(facet, value) for facet in ('category', 'size', 'price') for value in filters[facet]]
+        + ([('in_stock', 1)] if filters['stock'] else []),
+    )
+    
+    categories = Category.objects.all()
+    context = {
+        'products': products,
+        'categories': categories,
+        'sort': sort,
+        'facets': facets,
+        'filter_query': filter_query,
+        'total': result.total,
+        'page': page,
+        'has_previous': page > 1,
+        'has_next': result.has_next,
+    }
+    return render(request, 'store/home.html', context)
+
+def autocomplete(request):
+    """Search-as-you-type suggestions for ?q=, answered from the in-memory prefix index"""
+    query = request.GET.get('q', '')[:100]
+    return JsonResponse({
+        'query': query,
+        'suggestions': [
+            {'type': kind, 'label': label, 'url': url}
+            for kind, label, url in get_autocomplete_index().suggest(query)
+        ],
+    })
+
+def product_detail(request, id, slug):
+    product = get_object_or_404(Product, id=id, slug=slug, available=True)
+    add_to_cart_form = AddToCartForm(product=product)
+    
+    if request.method == 'POST':
+        form = AddToCartForm(request.POST, product=product)
+        if form.is_valid():
+            quantity = form.cleaned_data['quantity']
+            size = form.cleaned_data['size']
+            
+            # Add to cart logic
+            cart = get_cart(request)
+            try:
+                add_item(cart, product, size, quantity)
+            except GuestCartFull as e:
+                messages.error(request, str(e))
+                return redirect('store:cart_detail')
+            CART_ADDS.inc(view='product_detail')
+            
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return JsonResponse({
+                    'success': True,
+                    'message': 'Product added to cart',
+                    'cart_total': cart.get_total_items()
+                })
+            messages.success(request, 'Product added to cart successfully!')
+            return redirect('store:cart_detail')
+    
+    record_view(product.id)
+    context = {
+        'product': product,
+        'form': add_to_cart_form,
+        'recommended_products': recommended_products(product),
+    }
+    return render(request, 'store/product_detail.html', context)
@@ -0,0 +1,376 @@
+# store/views/checkout.py
+import json
+
+from django.conf import settings
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.http import JsonResponse
+from django.db import IntegrityError
+
+from .. import payments
+from ..metrics import CHECKOUT_STARTS, ORDERS_PAID
+from ..models import CheckoutQuote, Product, Order
+from ..pricing import InvalidCoupon, cart_lines, price_lines, price_product
+from ..quotes import PENDING_ADDRESS, get_quote, place_order, save_quote
+from ..ratelimit import ratelimit
+from ..reservations import OutOfStock, assign, release, release_orders, reserve
+from .cart import checkout_cart, get_cart
+
+def get_existing_order_id(razorpay_order_id):
+    """Return the id of the order already created for a Razorpay order, if any"""
+    return (
+        Order.objects.filter(razorpay_order_id=razorpay_order_id)
+        .order_by()
+        .values_list('id', flat=True)
+        .first()
+    )
+
+def create_gateway_order(amount, holds, flow, notes=None):
+    """Create a Razorpay order for held stock, giving the stock back if the call fails"""
+    CHECKOUT_STARTS.inc(flow=flow)
+    params = {
+        'amount': amount,
+        'currency': settings.RAZORPAY_CURRENCY,
+        'payment_capture': '1'  # Auto capture payment
+    }
+    if notes:
+        params['notes'] = notes
+    try:
+        razorpay_order = payments.create_order(params)
+    except Exception:
+        release(holds)
+        raise
+    assign(holds, razorpay_order['id'])
+    return razorpay_order
+
+def start_buy_now(request, product, size, quantity):
+    """Hold stock for a buy now order and create it, giving back the shopper's previous buy now holds"""
+    quote = price_product(product, quantity)
+    lines = [(product, size, quantity)]
+    release_orders([request.session.get('buy_now_order_id')])
+    holds = reserve(lines)
+    razorpay_order = create_gateway_order(quote.total_paise, holds, 'buy_now')
+    request.session['buy_now_order_id'] = razorpay_order['id']
+    
+    # Save what is being paid for, for the payment callback
+    save_quote(
+        razorpay_order['id'], CheckoutQuote.BUY_NOW, lines, quote, buy_now_customer(request.user),
+        user=request.user if request.user.is_authenticated else None,
+    )
+    return razorpay_order, quote.total_paise
+
+def buy_now_customer(user):
+    """Order name and email for buy now, whose address is collected after payment"""
+    if user.is_authenticated:
+        customer = {'first_name': user.first_name, 'last_name': user.last_name, 'email': user.email}
+    else:
+        customer = {'first_name': 'Guest', 'last_name': 'User', 'email': 'guest@example.com'}
+    return {**customer, **PENDING_ADDRESS}
+
+def already_paid_response(order_id):
+    """Response for a repeated payment callback that already produced an order"""
+    return JsonResponse({
+        'success': True,
+        'message': 'Payment already processed',
+        'order_id': order_id
+    })
+
+@ratelimit('razorpay_order', '10/m')
+def create_razorpay_order(request):
+    """Create Razorpay order for direct purchase"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            product_id = data.get('product_id')
+            quantity = int(data.get('quantity', 1))
+            size = data.get('size')
+            
+            if quantity < 1:
+                return JsonResponse({'success': False, 'error': 'Quantity must be at least 1'}, status=400)
+            
+            product = get_object_or_404(Product, id=product_id)
+            # Hold the stock, then create Razorpay Order (amount in paise)
+            razorpay_order, amount = start_buy_now(request, product, size, quantity)
+            
+            return JsonResponse({
+                'success': True,
+                'order_id': razorpay_order['id'],
+                'amount': amount,
+                'currency': settings.RAZORPAY_CURRENCY,
+                'key_id': settings.RAZORPAY_KEY_ID,
+                'product_name': product.name,
+                'description': f'{product.name} - Size {size}',
+                'prefill': {
+                    'name': request.user.get_full_name() if request.user.is_authenticated else '',
+                    'email': request.user.email if request.user.is_authenticated else ''
+                }
+            })
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+
+@csrf_exempt
+def payment_success(request):
+    """Handle successful payment"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            payment_id = data.get('razorpay_payment_id')
+            order_id = data.get('razorpay_order_id')
+            signature = data.get('razorpay_signature')
+            
+            # Verify payment signature
+            if not payments.verify_signature(order_id, payment_id, signature):
+                return JsonResponse({'success': False, 'error': 'Payment verification failed'}, status=400)
+            
+            # Retried callback: the order for this payment already exists
+            existing_order_id = get_existing_order_id(order_id)
+            if existing_order_id:
+                return already_paid_response(existing_order_id)
+            
+            # Get what was being paid for
+            quote = get_quote(order_id)
+            if not quote:
+                return JsonResponse({'success': False, 'error': 'No pending order found'}, status=400)
+            
+            # The unique razorpay_order_id makes a concurrent retry fail
+            # here instead of creating a second order.
+            try:
+                order = place_order(quote, payment_id)
+            except IntegrityError:
+                return already_paid_response(get_existing_order_id(order_id))
+            ORDERS_PAID.inc(flow='buy_now')
+            
+            return JsonResponse({
+                'success': True,
+                'message': 'Payment successful!',
+                'order_id': order.id
+            })
+            
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+
+@ratelimit('razorpay_order', '10/m')
+def buy_now(request):
+    """Handle buy now button - direct purchase"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            product_id = data.get('product_id')
+            quantity = int(data.get('quantity', 1))
+            size = data.get('size')
+            
+            if quantity < 1:
+                return JsonResponse({'success': False, 'error': 'Quantity must be at least 1'}, status=400)
+            
+            product = get_object_or_404(Product, id=product_id)
+            
+            # Hold the stock, then create Razorpay order
+            razorpay_order, amount = start_buy_now(request, product, size, quantity)
+            
+            return JsonResponse({
+                'success': True,
+                'order_id': razorpay_order['id'],
+                'amount': amount,
+                'currency': settings.RAZORPAY_CURRENCY,
+                'key_id': settings.RAZORPAY_KEY_ID,
+                'product_name': product.name,
+                'description': f'{product.name} - Size {size}',
+                'prefill': {
+                    'name': request.user.get_full_name() if request.user.is_authenticated else '',
+                    'email': request.user.email if request.user.is_authenticated else ''
+                }
+            })
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+
+def checkout(request):
+    cart = get_cart(request)
+    
+    if not cart.get_items():
+        messages.warning(request, 'Your cart is empty!')
+        return redirect('store:home')
+    
+    # Check if Razorpay is configured
+    if not payments.is_configured():
+        messages.error(request, 'Payment gateway not configured. Please contact support.')
+        return redirect('store:cart_detail')
+    
+    context = {
+        'cart': cart,
+        'quote': price_lines(cart_lines(cart.get_items())),
+        'razorpay_key_id': settings.RAZORPAY_KEY_ID,
+    }
+    return render(request, 'store/checkout.html', context)
+
+@require_POST
+@ratelimit('razorpay_order', '10/m')
+def create_checkout_order(request):
+    """Create Razorpay order for checkout"""
+    try:
+        # Check if Razorpay is configured
+        if not payments.is_configured():
+            return JsonResponse({
+                'success': False, 
+                'error': 'Payment gateway not configured'
+            }, status=500)
+        
+        data = json.loads(request.body)
+        cart = checkout_cart(request)
+        items = list(cart.get_items())
+        
+        if not items:
+            return JsonResponse({
+                'success': False, 
+                'error': 'Your cart is empty'
+            }, status=400)
+        
+        # Validate required fields
+        required_fields = ['first_name', 'last_name', 'email', 'address', 'city', 'postal_code']
+        for field in required_fields:
+            if not data.get(field):
+                return JsonResponse({
+                    'success': False, 
+                    'error': f'{field} is required'
+                }, status=400)
+        
+        # Price the cart in paise, applying active promotions
+        try:
+            quote = price_lines(cart_lines(items), data.get('coupon_code', ''))
+        except InvalidCoupon:
+            return JsonResponse({
+                'success': False, 
+                'error': 'Invalid coupon code'
+            }, status=400)
+        total_amount = quote.total_paise
+        
+        if total_amount <= 0:
+            return JsonResponse({
+                'success': False, 
+                'error': 'Invalid order amount'
+            }, status=400)
+        
+        # Hold the stock, then create Razorpay Order. Starting again gives
+        # back the holds taken for this cart's earlier, unpaid orders.
+        lines = [(item.product, item.size, item.quantity) for item in items]
+        release_orders(CheckoutQuote.objects.filter(cart=cart).values_list('razorpay_order_id', flat=True))
+        holds = reserve(lines)
+        razorpay_order = create_gateway_order(total_amount, holds, 'cart', notes={
+            'email': data.get('email'),
+            'name': f"{data.get('first_name')} {data.get('last_name')}"
+        })
+        
+        # Save the priced lines and shipping info for the payment callback
+        save_quote(
+            razorpay_order['id'], CheckoutQuote.CART, lines, quote,
+            {field: data.get(field) for field in required_fields},
+            user=request.user if request.user.is_authenticated else None,
+            cart=cart,
+        )
+        
+        return JsonResponse({
+            'success': True,
+            'order_id': razorpay_order['id'],
+            'amount': total_amount,
+            'discount': str(quote.discount),
+            'shipping': str(quote.shipping),
+            'currency': settings.RAZORPAY_CURRENCY,
+            'key_id': settings.RAZORPAY_KEY_ID,
+            'customer_info': {
+                'name': f"{data.get('first_name')} {data.get('last_name')}",
+                'email': data.get('email'),
+                'contact': ''  # You can add phone number field if needed
+            }
+        })
+        
+    except OutOfStock as e:
+        return JsonResponse({
+            'success': False, 
+            'error': str(e)
+        }, status=400)
+    except payments.GatewayError as e:
+        return JsonResponse({
+            'success': False, 
+            'error': f'Razorpay error: {str(e)}'
+        }, status=400)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False, 
+            'error': 'Invalid request data'
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'success': False, 
+            'error': f'Server error: {str(e)}'
+        }, status=500)
+
+@csrf_exempt
+def checkout_payment_success(request):
+    """Handle successful payment for checkout"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            payment_id = data.get('razorpay_payment_id')
+            order_id = data.get('razorpay_order_id')
+            signature = data.get('razorpay_signature')
+            
+            if not all([payment_id, order_id, signature]):
+                return JsonResponse({
+                    'success': False, 
+                    'error': 'Missing payment information'
+                }, status=400)
+            
+            # Verify payment signature
+            if not payments.verify_signature(order_id, payment_id, signature):
+                return JsonResponse({
+                    'success': False, 
+                    'error': 'Payment signature verification failed'
+                }, status=400)
+            
+            # Retried callback: the order for this payment already exists
+            existing_order_id = get_existing_order_id(order_id)
+            if existing_order_id:
+                return already_paid_response(existing_order_id)
+            
+            # Get what was being paid for
+            quote = get_quote(order_id)
+            if not quote:
+                return JsonResponse({
+                    'success': False, 
+                    'error': 'No pending checkout found. Please try again.'
+                }, status=400)
+            
+            # Create the order and its items from the quote and empty the
+            # cart in one transaction. The unique razorpay_order_id makes a
+            # concurrent retry fail here instead of creating a second order.
+            try:
+                order = place_order(quote, payment_id, signature)
+            except IntegrityError:
+                return already_paid_response(get_existing_order_id(order_id))
+            ORDERS_PAID.inc(flow='cart')
+            
+            request.guest_cart.clear()
+            
+            return JsonResponse({
+                'success': True,
+                'message': 'Payment successful!',
+                'order_id': order.id
+            })
+            
+        except Exception as e:
+            return JsonResponse({
+                'success': False, 
+                'error': f'Server error: {str(e)}'
+            }, status=500)
+    
+    return JsonResponse({
+        'success': False, 
+        'error': 'Invalid request method'
+    }, status=400)
@@ -0,0 +1,30 @@
+# store/views/feeds.py
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .. import feeds
+
+def feed_response(request, name, content_type, generate):
+    """Serve the pregenerated gzip of `name` if it is current, else stream it"""
+    path = feeds.pregenerated(name)
+    if path and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(generate(), content_type=content_type)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+def product_feed(request, format):
+    if format not in feeds.CONTENT_TYPES:
+        raise Http404
+    generate = feeds.xml_feed if format == 'xml' else feeds.csv_feed
+    return feed_response(request, f'products.{format}', feeds.CONTENT_TYPES[format], generate)
+
+def sitemap_index(request):
+    return feed_response(request, 'sitemap.xml', 'application/xml', feeds.sitemap_index)
+
+def sitemap_products(request, page):
+    if page < 1 or page > feeds.sitemap_pages():
+        raise Http404
+    return feed_response(request, f'sitemap-products-{page}.xml', 'application/xml', lambda: feeds.sitemap(page))
@@ -0,0 +1,17 @@
+# store/views/monitoring.py
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from .. import metrics
+
+def metrics_view(request):
+    """Prometheus metrics, for staff or a scraper sending the METRICS_TOKEN bearer token"""
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    allowed = request.user.is_staff or (
+        token and constant_time_compare(authorization, f'Bearer {token}')
+    )
+    if not allowed:
+        return HttpResponseForbidden('Staff only')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
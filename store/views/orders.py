@@ -0,0 +1,76 @@
+# store/views/orders.py
+from django.shortcuts import render, redirect
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+from ..archive import customer_orders, get_order
+from ..models import Order
+
+def order_confirmation(request, order_id):
+    """Display order confirmation after successful payment"""
+    try:
+        order = get_order(id=order_id)
+        
+        # Security: Check if user owns this order
+        if request.user.is_authenticated:
+            if order.user and order.user != request.user:
+                messages.error(request, 'You do not have permission to view this order.')
+                return redirect('store:home')
+        else:
+            # For guest checkout, you might want additional verification
+            # For now, just show the order
+            pass
+            
+        context = {
+            'order': order
+        }
+        return render(request, 'store/order_confirmation.html', context)
+        
+    except Order.DoesNotExist:
+        messages.error(request, 'Order not found.')
+        return redirect('store:home')
+
+ORDER_HISTORY_PAGE_SIZE = 20
+
+def make_order_cursor(order):
+    """Keyset cursor pointing just past an order in (-created, -id) order"""
+    return f'{order.created.isoformat()}|{order.id}'
+
+def parse_order_cursor(cursor):
+    """Return (created, id) from a cursor, or None if it is missing or malformed"""
+    try:
+        created, order_id = cursor.split('|')
+        created = parse_datetime(created)
+        if created is None:
+            return None
+        return created, int(order_id)
+    except (AttributeError, ValueError):
+        return None
+
+@login_required
+def order_history(request):
+    """List the customer's orders, newest first, one keyset page at a time"""
+    cursor = parse_order_cursor(request.GET.get('before'))
+    
+    # Fetch one extra row to know whether there is a next page
+    page = customer_orders(request.user, cursor, ORDER_HISTORY_PAGE_SIZE + 1)
+    has_more = len(page) > ORDER_HISTORY_PAGE_SIZE
+    page = page[:ORDER_HISTORY_PAGE_SIZE]
+    
+    context = {
+        'orders': page,
+        'next_cursor': make_order_cursor(page[-1]) if has_more else None,
+        'is_first_page': cursor is None,
+    }
+    return render(request, 'store/order_history.html', context)
+
+@login_required
+def order_detail(request, order_id):
+    """Show one of the customer's past orders"""
+    try:
+        order = get_order(id=order_id, user=request.user)
+    except Order.DoesNotExist:
+        raise Http404('Order not found')
+    return render(request, 'store/order_detail.html', {'order': order})
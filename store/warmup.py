@@ -0,0 +1,125 @@
+# store/warmup.py
+"""
+Warming a process up before it serves its first request.
+
+Templates are compiled, URL patterns resolved and the catalog indexes
+built lazily, so without this the first requests in every worker pay for
+all of them. preload() does that work in the process that loads the WSGI
+application (see tshirt_store/wsgi.py): with a preforking server started
+with `--preload`, workers are forked after it and share the warmed
+objects copy-on-write. It then closes database connections, which must
+not be shared across a fork, and freezes the garbage collector so that
+collections in the workers do not touch, and so copy, the shared pages.
+
+`python manage.py warmup` runs the same steps as a deploy check and
+reports how long each took. It also checks the static, media and output
+directories, and rewrites the feed and sitemap files if they are stale.
+Those checks scan the media files and the files are shared by every
+process, so preload() leaves both to the command.
+"""
+import gc
+import importlib
+import os
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import URLPattern, get_resolver
+
+from . import autocomplete, facets, feeds
+from .models import Product
+from .pricing import get_rules
+
+
+def load_templates():
+    """Compile every template in the project and app template directories"""
+    directories = [Path(directory) for engine in settings.TEMPLATES for directory in engine['DIRS']]
+    directories.append(Path(apps.get_app_config('store').path) / 'templates')
+    names = sorted({
+        path.relative_to(directory).as_posix()
+        for directory in directories if directory.is_dir()
+        for path in directory.rglob('*') if path.suffix in ('.html', '.txt')
+    })
+    for name in names:
+        # With DEBUG off the cached loader keeps the compiled template
+        get_template(name)
+    return f'{len(names)} templates compiled'
+
+
+def load_urls():
+    """Populate the resolver's reverse lookups and compile every pattern's regex"""
+    resolver = get_resolver()
+    resolver.reverse_dict  # Populated on first access
+    count = 0
+    pending = list(resolver.url_patterns)
+    while pending:
+        pattern = pending.pop()
+        pattern.pattern.regex  # Compiled on first access
+        if isinstance(pattern, URLPattern):
+            count += 1
+        else:
+            pending.extend(pattern.url_patterns)
+    return f'{count} URL patterns resolved'
+
+
+def load_catalog():
+    """Build the facet and autocomplete indexes and compile the promotion rules"""
+    index = facets.get_index()
+    autocomplete.get_index()
+    get_rules()
+    return f'catalog indexes built for {index.size} products'
+
+
+def load_payment_sdk():
+    """Import the razorpay SDK, which the URLconf leaves to the first checkout"""
+    importlib.import_module('razorpay')
+    return 'payment SDK imported'
+
+
+STEPS = [load_templates, load_urls, load_catalog, load_payment_sdk]
+
+
+def check_paths():
+    """Problems with the configured static, media and output directories, as messages"""
+    problems = []
+    if not settings.DEBUG:
+        missing = [
+            path for finder in finders.get_finders()
+            for path, _ in finder.list(['CVS', '.*', '*~'])
+            if not staticfiles_storage.exists(path)
+        ]
+        if missing:
+            problems.append(f'{len(missing)} static files not collected into STATIC_ROOT (e.g. {missing[0]})')
+    if not os.path.isdir(settings.MEDIA_ROOT):
+        problems.append(f'MEDIA_ROOT {settings.MEDIA_ROOT} does not exist')
+    else:
+        images = Product.objects.exclude(image='').values_list('image', flat=True).distinct().iterator()
+        missing = sum(1 for image in images if not os.path.exists(os.path.join(settings.MEDIA_ROOT, image)))
+        if missing:
+            problems.append(f'{missing} product images missing from MEDIA_ROOT')
+    for setting in ('FEED_ROOT', 'METRICS_DIR', 'PROFILE_DIR'):
+        directory = Path(getattr(settings, setting))
+        # Created on first write, so only its nearest existing parent has to be writable
+        existing = next(path for path in (directory, *directory.parents) if path.exists())
+        if not os.access(existing, os.W_OK):
+            problems.append(f'{setting} {directory} is not writable')
+    return problems
+
+
+def refresh_feeds():
+    """Write the feed and sitemap files if they are older than the catalog"""
+    if feeds.pregenerated('sitemap.xml'):
+        return 'feeds already current'
+    return f'{len(feeds.pregenerate())} feed files written'
+
+
+def preload():
+    """Warm this process up before workers are forked from it"""
+    for step in STEPS:
+        step()
+    connections.close_all()
+    gc.freeze()
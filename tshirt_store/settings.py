@@ -29,6 +29,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.guest_cart.GuestCartMiddleware',
+    'store.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -59,6 +61,14 @@ DATABASES = {
     }
 }
 
+# Use a shared backend (Redis, Memcached or the database cache) in production
+# so rate limits and other cached state apply across worker processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -90,8 +100,15 @@ MEDIA_ROOT = '/home/yourusername/tshirt_store/media'  # Update with your usernam
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Absolute URLs in product feeds and the sitemap
+SITE_URL = 'https://yourusername.pythonanywhere.com'  # Update with your username
+
+# Gzipped feeds written by `python manage.py generate_feeds`
+FEED_ROOT = BASE_DIR / 'feeds'
+FEED_MAX_AGE_MINUTES = 90  # Older files are not served, as stock changes do not mark them stale; regenerate more often
+
 # Login URLs
-LOGIN_URL = 'login'
+LOGIN_URL = 'store:login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
 
@@ -100,6 +117,75 @@ RAZORPAY_KEY_ID = 'rzp_test_your_test_key'  # Use your test key for now
 RAZORPAY_KEY_SECRET = 'your_test_secret'
 RAZORPAY_CURRENCY = 'INR'
 
+# Pricing
+SHIPPING_FEE_PAISE = 0  # Flat shipping fee; free shipping promotions waive it
+PROMOTION_REFRESH_SECONDS = 60  # How often workers reload promotion rules
+
+# Guests' carts live in this signed cookie until they check out or sign in
+GUEST_CART_COOKIE = 'cart'
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+GUEST_CART_MAX_LINES = 30
+
+# Stock is held this long for a pending Razorpay payment
+# (expired holds are released by `python manage.py release_reservations`)
+STOCK_HOLD_MINUTES = 15
+
+# Payment reconciliation against Razorpay (`python manage.py reconcile_payments`, hourly from cron)
+PAYMENT_RECONCILE_WORKERS = 4  # Pages of payments fetched at once
+PAYMENT_RECONCILE_DELAY_MINUTES = 15  # Recent payments are left to the success callback
+PAYMENT_RECONCILE_OVERLAP_MINUTES = 60  # Each run re-reads the end of the previous window
+PAYMENT_RECONCILE_FIRST_RUN_HOURS = 24
+
+# What each Razorpay order pays for is saved as a CheckoutQuote, deleted after this
+# many days by `python manage.py reconcile_payments`
+CHECKOUT_QUOTE_KEEP_DAYS = 7
+
+# Recommendations (rebuild with `python manage.py build_recommendations`)
+RECOMMENDATIONS_TOP_K = 8
+
+# Trending scores halve every TRENDING_HALF_LIFE_HOURS (`python manage.py refresh_trending`)
+TRENDING_HALF_LIFE_HOURS = 72
+
+# Faceted browsing: the facet index is rebuilt on catalog changes and at least this often
+FACET_REFRESH_SECONDS = 60
+
+# Search suggestions: the prefix index is updated on catalog changes and rebuilt at least this often
+AUTOCOMPLETE_REBUILD_SECONDS = 600
+
+# Product view counts are buffered per worker and written every VIEW_COUNT_FLUSH_SECONDS
+VIEW_COUNT_FLUSH_SECONDS = 30
+
+# Paid orders older than this move to the archive tables (`python manage.py archive_orders`)
+ORDER_ARCHIVE_AFTER_DAYS = 365
+
+# Request profiling (see store/profiling.py; staff can send `X-Profile: 1`)
+PROFILE_SAMPLE_RATE = 0.0  # e.g. 0.001 to profile one request in a thousand
+PROFILE_DIR = BASE_DIR / 'profiles'
+PROFILE_KEEP = 500  # Newest profiles kept on disk
+
+# Metrics at /metrics/ (staff, or `Authorization: Bearer <METRICS_TOKEN>` for the scraper)
+METRICS_DIR = BASE_DIR / 'metrics'  # Shared by all worker processes; clear on deploy
+METRICS_FLUSH_SECONDS = 15
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Email
+DEFAULT_FROM_EMAIL = 'Loom State <orders@loomstate.in>'
+
+# Background tasks (run with `python manage.py run_tasks`)
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BASE_SECONDS = 30  # Doubles after every failed attempt
+TASK_RETRY_MAX_SECONDS = 3600
+TASK_LEASE_SECONDS = 300  # A task running longer than this is retried
+
+# Rate limiting
+RATELIMIT_ENABLED = True
+RATELIMIT_CACHE = 'default'
+RATELIMIT_IP_HEADER = 'REMOTE_ADDR'  # e.g. 'HTTP_X_FORWARDED_FOR' behind a proxy
+RATELIMIT_PROXIES = 1  # Proxies in front of the app that append to RATELIMIT_IP_HEADER
+RATELIMITS = {
+    # Override per view, e.g. 'add_to_cart': '60/m', or None to disable
+}
+
 # Security Settings for Production
 SECURE_SSL_REDIRECT = False  # PythonAnywhere handles SSL
 SESSION_COOKIE_SECURE = True
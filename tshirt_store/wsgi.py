@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tshirt_store.settings')
 
 application = get_wsgi_application()
+
+# Under a preforking server started with --preload (e.g. `gunicorn --preload`),
+# set DJANGO_PRELOAD=1 to warm the master so workers fork with templates, URLs
+# and catalog indexes already loaded (see store/warmup.py).
+if os.environ.get('DJANGO_PRELOAD') == '1':
+    from store.warmup import preload
+    preload()